@@ -0,0 +1,143 @@
+# api_client.py
+# Helpers shared by the Streamlit pages for talking to the API.
+# Streamlit reruns the whole page on every widget interaction, so GETs go
+# through st.cache_data (short TTL) and, past the TTL, a conditional request
+# with the last ETag. Mutations call invalidate_cache() for the session.
+import threading
+from collections import OrderedDict
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = "http://127.0.0.1:8000"
+CACHE_TTL_SECONDS = 30
+REQUEST_TIMEOUT_SECONDS = 60
+ETAG_STORE_BYTES = 32 * 1024 * 1024
+
+# (path, params, token) -> (etag, json, size) of the last 200 answer, for If-None-Match;
+# least recently used first, bounded by the size of the response bodies
+_etag_store = OrderedDict()
+_etag_store_size = 0
+_etag_lock = threading.Lock()
+
+
+class APIError(Exception):
+    def __init__(self, status_code: int, detail):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@st.cache_resource
+def _http_session():
+    # One keep-alive connection pool shared by every browser session of this Streamlit server
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _error(response):
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    return APIError(response.status_code, detail)
+
+
+def _refresh_access_token():
+    refresh_token = st.session_state.get("refresh_token")
+    if not refresh_token:
+        return False
+    response = _http_session().post(f"{API_URL}/token/refresh", json={"refresh_token": refresh_token},
+                                    timeout=REQUEST_TIMEOUT_SECONDS)
+    if response.status_code != 200:
+        return False
+    tokens = response.json()
+    st.session_state.token = tokens["access_token"]
+    st.session_state.refresh_token = tokens["refresh_token"]
+    return True
+
+
+def _send(method: str, path: str, token, headers=None, **kwargs):
+    auth = {"Authorization": f"Bearer {token}"} if token else {}
+    return _http_session().request(method, f"{API_URL}{path}", headers={**auth, **(headers or {})},
+                                   timeout=REQUEST_TIMEOUT_SECONDS, **kwargs)
+
+
+def api_request(method: str, path: str, headers=None, **kwargs):
+    """Send an authenticated request; an expired access token is refreshed once and the request retried."""
+    response = _send(method, path, st.session_state.get("token"), headers, **kwargs)
+    if response.status_code == 401 and not path.startswith("/token") and _refresh_access_token():
+        response = _send(method, path, st.session_state.get("token"), headers, **kwargs)
+    return response
+
+
+def _remembered(key):
+    with _etag_lock:
+        entry = _etag_store.get(key)
+        if entry is not None:
+            _etag_store.move_to_end(key)
+        return entry
+
+
+def _remember(key, etag: str, data, size: int):
+    global _etag_store_size
+    if size > ETAG_STORE_BYTES // 4:
+        return  # one huge payload would push out everything else
+    with _etag_lock:
+        previous = _etag_store.pop(key, None)
+        if previous is not None:
+            _etag_store_size -= previous[2]
+        _etag_store[key] = (etag, data, size)
+        _etag_store_size += size
+        while _etag_store_size > ETAG_STORE_BYTES:
+            _etag_store_size -= _etag_store.popitem(last=False)[1][2]
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _cached_get(path: str, params: tuple, token: str, generation: int):
+    # Must not touch st.session_state: a cache hit would not replay the change. A 401 is raised
+    # (exceptions are not cached) and get_json refreshes the token outside this function.
+    key = (path, params, token)
+    remembered = _remembered(key)
+    headers = {"If-None-Match": remembered[0]} if remembered else {}
+    response = _send("GET", path, token, headers, params=list(params))
+    if response.status_code == 304 and remembered:
+        return remembered[1]
+    if response.status_code != 200:
+        raise _error(response)
+    data = response.json()
+    if "etag" in response.headers:
+        _remember(key, response.headers["etag"], data, len(response.content))
+    return data
+
+
+def get_json(path: str, params=None):
+    """GET a JSON endpoint through the session cache. Raises APIError for non-200 answers."""
+    items = params.items() if isinstance(params, dict) else (params or [])
+    flat = tuple(sorted((key, str(value)) for key, value in items if value is not None))
+    generation = st.session_state.get("api_generation", 0)
+    try:
+        return _cached_get(path, flat, st.session_state.get("token"), generation)
+    except APIError as e:
+        if e.status_code != 401 or not _refresh_access_token():
+            raise
+    return _cached_get(path, flat, st.session_state.get("token"), generation)
+
+
+def invalidate_cache():
+    """Forget this session's cached GETs; call after every successful mutation."""
+    st.session_state.api_generation = st.session_state.get("api_generation", 0) + 1
+
+
+def get_catalog():
+    """Categories, report types, districts, roles and statuses, fetched once per session."""
+    if "catalog" not in st.session_state:
+        response = api_request("GET", "/enums/")
+        if response.status_code != 200:
+            raise _error(response)
+        st.session_state.catalog = response.json()
+    return st.session_state.catalog
@@ -1,14 +1,14 @@
 # app.py
 import streamlit as st
-import requests
-
-API_URL = "http://127.0.0.1:8000"
+from api_client import api_request, invalidate_cache
 
 st.set_page_config(page_title="Login", layout="wide")
 
 
 if "token" not in st.session_state:
     st.session_state.token = None
+if "refresh_token" not in st.session_state:
+    st.session_state.refresh_token = None
 if "username" not in st.session_state:
     st.session_state.username = None
 if "role" not in st.session_state:
@@ -17,17 +17,21 @@ if "district" not in st.session_state:
     st.session_state.district = None
 
 def login(username, password):
-    response = requests.post(f"{API_URL}/token", data={"username": username, "password": password})
+    response = api_request("POST", "/token", data={"username": username, "password": password})
     if response.status_code == 200:
         data = response.json()
         st.session_state.token = data["access_token"]
-        user_info = requests.get(f"{API_URL}/me", headers={"Authorization": f"Bearer {st.session_state.token}"}).json()
+        st.session_state.refresh_token = data["refresh_token"]
+        user_info = api_request("GET", "/me").json()
         st.session_state.username = user_info["username"]
         st.session_state.role = user_info["role"]
         st.session_state.district = user_info["district"]
         st.session_state.logged_in = True
+        invalidate_cache()
         st.success("Logged in successfully!")
         st.rerun()
+    elif response.status_code == 429:
+        st.error("Too many login attempts, please wait a few minutes")
     else:
         st.error("Invalid username or password")
 
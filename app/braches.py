@@ -1,10 +1,3 @@
-from enum import Enum
-
-
-class Braches(str, Enum):
-    DISTRICT1 = "District1"
-    DISTRICT2 = "District2"
-    DISTRICT3 = "Arbaminch"
-    DISTRICT4 = "Sodo"
-    DISTRICT5 = "Hossana"
-    DISTRICT6 = "Karate"
\ No newline at end of file
+# braches.py
+# Kept for older imports; the definitions live in catalog.py.
+from catalog import District as Braches
@@ -0,0 +1,116 @@
+# cache.py
+# Small in-process caches shared by the request handlers. Each worker process
+# keeps its own copy, so entries must be safe to drop at any time.
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire ttl seconds after they were set."""
+
+    def __init__(self, maxsize: int, ttl: float, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires <= self.timer():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.timer() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache:
+    """LRU of encoded response bodies, bounded by their total size in bytes.
+
+    Entries carry tags naming the data they were built from; invalidate(tag)
+    drops them. Compressed copies of a body are kept with its entry and count
+    towards the same bound. A body built while an invalidation ran is not stored, so a
+    write can never be hidden behind a response computed just before it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._entries = OrderedDict()  # key -> (etag, body, tags, {encoding: encoded body})
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key, etag: str, body: bytes, tags, generation: int):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._discard(key)
+            self._entries[key] = (etag, body, frozenset(tags), {})
+            self._size += len(body)
+            self._evict()
+
+    def get_encoded(self, key, etag: str, encoding: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            return entry[3].get(encoding)
+
+    def put_encoded(self, key, etag: str, encoding: str, body: bytes):
+        """Keep a compressed copy of the entry at key, if that entry still holds the body tagged etag."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag or encoding in entry[3]:
+                return
+            entry[3][encoding] = body
+            self._size += len(body)
+            self._evict()
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, entry in self._entries.items() if entry[2] & set(tags)]:
+                self._discard(key)
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1]) + sum(len(encoded) for encoded in entry[3].values())
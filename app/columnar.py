@@ -0,0 +1,134 @@
+# columnar.py
+# Parsed report frames are kept as Parquet files next to their workbook blob,
+# so reads keep dtypes and can load just the columns they need.
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from storage import atomic_write, blob_store
+
+PARQUET_SUFFIX = ".parquet"
+FRAME_ROW_GROUP_ROWS = 50_000  # small enough that a page of rows decodes one group, not the whole file
+
+
+def frame_path(sha256: str) -> str:
+    return blob_store.path(sha256, PARQUET_SUFFIX)
+
+
+def has_frame(sha256: str) -> bool:
+    return bool(sha256) and os.path.exists(frame_path(sha256))
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Excel columns that mix numbers and text cannot be typed; keep them as strings
+        mixed = {col: df[col].astype(str) for col in df.columns if df[col].dtype == object}
+        return pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+
+
+def write_frame(sha256: str, df: pd.DataFrame) -> str:
+    """Write (or rewrite) the frame of a workbook; the latest parse wins, so a leftover from a failed one is replaced."""
+    path = frame_path(sha256)
+    with atomic_write(path) as tmp_path:
+        pq.write_table(to_table(df), tmp_path, row_group_size=FRAME_ROW_GROUP_ROWS)
+    return path
+
+
+def read_table(sha256: str, columns=None) -> pa.Table:
+    return pq.read_table(frame_path(sha256), columns=columns, memory_map=True)
+
+
+def read_frame(sha256: str, columns=None) -> pd.DataFrame:
+    return read_table(sha256, columns).to_pandas()
+
+
+_CONDITION_RE = re.compile(r"^\s*(.+?)\s*(==|!=|>=|<=|>|<|=)\s*(.*?)\s*$")
+_OPERATORS = {
+    "=": lambda field, value: field == value,
+    "==": lambda field, value: field == value,
+    "!=": lambda field, value: field != value,
+    ">=": lambda field, value: field >= value,
+    "<=": lambda field, value: field <= value,
+    ">": lambda field, value: field > value,
+    "<": lambda field, value: field < value,
+}
+
+
+def _typed(value: str, arrow_type):
+    if pa.types.is_timestamp(arrow_type):
+        return pa.scalar(datetime.fromisoformat(value), type=arrow_type)
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    if pa.types.is_integer(arrow_type):
+        return int(value)
+    return value
+
+
+def row_filter(schema: pa.Schema, conditions):
+    """Parse "Column>=value" strings into one pyarrow expression; raises ValueError on bad input."""
+    expression = None
+    for condition in conditions:
+        match = _CONDITION_RE.match(condition)
+        if not match:
+            raise ValueError(f"Cannot parse filter '{condition}'")
+        column, operator, value = match.groups()
+        if column not in schema.names:
+            raise ValueError(f"Unknown column '{column}'")
+        try:
+            typed = _typed(value, schema.field(column).type)
+        except ValueError:
+            raise ValueError(f"'{value}' is not a valid value for column '{column}'")
+        part = _OPERATORS[operator](pc.field(column), typed)
+        expression = part if expression is None else expression & part
+    return expression
+
+
+def frame_schema(sha256: str) -> pa.Schema:
+    return pq.read_schema(frame_path(sha256))
+
+
+def scan_frame(sha256: str, columns=None, filter=None, offset: int = 0, limit: int = 100):
+    """Rows [offset, offset + limit) of a report frame, matching filter, as (table, total matching rows).
+
+    Only the projected columns are read. Without a filter only the row groups the
+    page overlaps are decoded; with one, row-group statistics prune the scan and
+    reading stops as soon as the page is full.
+    """
+    path = frame_path(sha256)
+    if filter is None:
+        source = pq.ParquetFile(path, memory_map=True)
+        total = source.metadata.num_rows
+        groups, first, start = [], None, 0
+        for index in range(source.num_row_groups):
+            rows = source.metadata.row_group(index).num_rows
+            if start + rows > offset and start < offset + limit:
+                groups.append(index)
+                first = start if first is None else first
+            start += rows
+        if not groups:
+            return source.schema_arrow.empty_table().select(columns or source.schema_arrow.names), total
+        table = source.read_row_groups(groups, columns=columns)
+        return table.slice(offset - first, limit), total
+
+    scanner = ds.dataset(path, format="parquet").scanner(columns=columns, filter=filter)
+    batches, skip, wanted = [], offset, limit
+    for batch in scanner.to_batches():
+        if wanted == 0:
+            break
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        batch = batch.slice(skip, wanted)
+        skip = 0
+        batches.append(batch)
+        wanted -= batch.num_rows
+    total = ds.dataset(path, format="parquet").count_rows(filter=filter)
+    return pa.Table.from_batches(batches, schema=scanner.projected_schema), total
@@ -0,0 +1,108 @@
+# compression.py
+# Negotiated gzip/brotli compression for buffered text responses (JSON, CSV).
+# Streamed downloads pass through untouched: workbooks, Parquet and ZIP files
+# are already compressed, and Range responses must keep their byte offsets.
+import gzip
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4  # the fast end; higher qualities cost far more CPU than they save in bytes
+COMPRESS_THREAD_BYTES = 64 * 1024  # larger bodies are compressed in a worker thread, not on the event loop
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def _accepted(header: str):
+    """Encodings the client accepts, ignoring those it refuses with q=0."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, offered=("br", "gzip")):
+    """The first offered encoding the client accepts, or None; br only counts when brotli is installed."""
+    accepted = _accepted(accept_encoding)
+    for encoding in offered:
+        if encoding in accepted and (encoding != "br" or brotli is not None):
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+async def compress_async(body: bytes, encoding: str) -> bytes:
+    if len(body) < COMPRESS_THREAD_BYTES:
+        return compress(body, encoding)
+    return await run_in_threadpool(compress, body, encoding)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held back until the body shows whether it is worth compressing
+                return
+            if start is None:
+                await send(message)
+                return
+            response_start, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body") or not self._compressible(response_start, body):
+                await send(response_start)
+                await send(message)
+                return
+            compressed = await compress_async(body, encoding)
+            response_headers = []
+            for key, value in response_start["headers"]:
+                if key.lower() == b"content-length":
+                    continue
+                if key.lower() == b"etag" and not value.startswith(b"W/"):
+                    value = b"W/" + value  # the bytes differ from the identity body; If-None-Match compares weakly
+                response_headers.append((key, value))
+            response_headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(compressed)).encode())]
+            if not any(k.lower() == b"vary" for k, _ in response_headers):
+                response_headers.append((b"vary", b"Accept-Encoding"))
+            await send({**response_start, "headers": response_headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, start, body: bytes) -> bool:
+        if start["status"] != 200 or len(body) < self.minimum_size:
+            return False
+        headers = {k.lower(): v for k, v in start["headers"]}
+        if b"content-encoding" in headers or b"content-range" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
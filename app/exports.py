@@ -0,0 +1,110 @@
+# exports.py
+# Downloadable copies of the merged reports, written from the merged Parquet
+# partitions one record batch at a time. The bytes go to the client as they
+# are produced and into a file kept per approval set, so a repeat download is
+# a plain file stream.
+import hashlib
+import os
+
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from merged import REPORT_CODE_COLUMN, iter_batches, report_type_dir
+from responses import XLSX_MEDIA_TYPE, ChunkBuffer
+from storage import UPLOAD_DIR, atomic_write
+
+EXPORT_DIR = os.path.join(UPLOAD_DIR, "exports")
+EXPORT_BATCH_ROWS = 10_000
+EXPORT_MEDIA_TYPES = {
+    "xlsx": XLSX_MEDIA_TYPE,
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def approval_version(approved) -> str:
+    """Hash of the approved (report_code, file_sha256) pairs a merge is built from."""
+    digest = hashlib.sha256()
+    for report_code, file_sha256 in sorted(approved, key=lambda pair: pair[0]):
+        digest.update(f"{report_code}\0{file_sha256 or ''}\n".encode())
+    return digest.hexdigest()[:32]
+
+
+def export_path(report_type: str, version: str, fmt: str) -> str:
+    return os.path.join(report_type_dir(EXPORT_DIR, report_type), f"{version}.{fmt}")
+
+
+# Writers yield after each batch so the bytes written so far can be sent
+def _write_xlsx(sink, schema, batches):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(schema.names)
+    for batch in batches:
+        for row in zip(*(column.to_pylist() for column in batch.columns)):
+            sheet.append(row)
+        yield
+    # openpyxl keeps the rows in its own temporary file; the archive is only written on save
+    workbook.save(sink)
+
+
+def _write_csv(sink, schema, batches):
+    with pacsv.CSVWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield
+
+
+def _write_parquet(sink, schema, batches):
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)  # one row group per batch
+            yield
+
+
+WRITERS = {"xlsx": _write_xlsx, "csv": _write_csv, "parquet": _write_parquet}
+
+
+class _Superseded(Exception):
+    """The merge changed while the export was written: the bytes were sent, the file is not kept."""
+
+
+def _flush(buffer: ChunkBuffer, out):
+    data = buffer.drain()
+    if data:
+        out.write(data)
+        yield data
+
+
+def stream_export(report_type: str, version: str, fmt: str, expected_codes):
+    """Yield the export of the current merge while it is written, keeping the file on disk under version.
+
+    CSV and Parquet bytes leave with every batch; an XLSX archive only exists once the
+    workbook is saved. The file is only kept when the merge held exactly expected_codes,
+    since an approval committed a moment ago may not have reached the partitions yet.
+    Older cached versions of the same format are removed.
+    """
+    merged_schema, merged_batches = iter_batches(report_type, EXPORT_BATCH_ROWS)
+    schema = merged_schema.remove(merged_schema.get_field_index(REPORT_CODE_COLUMN))
+    codes = set()
+
+    def batches():
+        for batch in merged_batches:
+            codes.update(batch.column(REPORT_CODE_COLUMN).unique().to_pylist())
+            yield batch.select(schema.names)
+
+    path = export_path(report_type, version, fmt)
+    buffer = ChunkBuffer()
+    try:
+        with atomic_write(path) as tmp_path, open(tmp_path, "wb") as out:
+            for _ in WRITERS[fmt](buffer, schema, batches()):
+                yield from _flush(buffer, out)
+            yield from _flush(buffer, out)
+            if codes != set(expected_codes):
+                raise _Superseded
+    except _Superseded:
+        return
+    directory = os.path.dirname(path)
+    for name in os.listdir(directory):
+        if name.endswith(f".{fmt}") and name != os.path.basename(path):
+            os.remove(os.path.join(directory, name))
@@ -0,0 +1,91 @@
+# facts.py
+# Typed fact tables, one per upload template, holding every uploaded row with
+# its district, date and numeric measures so aggregations run as SQL GROUP BY.
+import pyarrow.parquet as pq
+from sqlalchemy import Column, Date, Float, ForeignKey, Index, Integer, String, Table, cast, func, select
+
+from validation import NUMBER, TEMPLATE_SPECS
+
+FACT_BATCH_ROWS = 10_000
+
+
+def fact_table_name(template: str) -> str:
+    return f"{template}_facts"
+
+
+def measure_columns(spec):
+    """Template column name -> fact table column name for every numeric measure."""
+    return {name: name.lower() for name, kind in spec.columns.items() if kind == NUMBER}
+
+
+def build_fact_tables(metadata):
+    tables = {}
+    for template, spec in TEMPLATE_SPECS.items():
+        name = fact_table_name(template)
+        tables[template] = Table(
+            name, metadata,
+            Column("id", Integer, primary_key=True),
+            Column("report_data_id", Integer, ForeignKey("report_data.id"), nullable=False, index=True),
+            Column("report_code", String, nullable=False),
+            Column("district", String, nullable=False),
+            Column("date", Date, nullable=True),
+            *[Column(column, Float, nullable=True) for column in measure_columns(spec).values()],
+            Index(f"ix_{name}_district_date", "district", "date"),
+        )
+    return tables
+
+
+def iter_fact_batches(frame_path: str, spec, report_data_id: int, report_code: str, batch_rows: int = FACT_BATCH_ROWS):
+    """Read a report's Parquet frame in record batches and yield lists of fact row dicts."""
+    measures = measure_columns(spec)
+    source = pq.ParquetFile(frame_path)
+    for batch in source.iter_batches(batch_size=batch_rows, columns=["District", "Date", *measures]):
+        data = batch.to_pydict()
+        dates = [value.date() if value is not None else None for value in data["Date"]]
+        rows = []
+        for i, district in enumerate(data["District"]):
+            row = {"report_data_id": report_data_id, "report_code": report_code, "district": district, "date": dates[i]}
+            for template_column, fact_column in measures.items():
+                row[fact_column] = data[template_column][i]
+            rows.append(row)
+        yield rows
+
+
+def month_expression(column, dialect_name: str):
+    if dialect_name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def quarter_expression(month):
+    """"YYYY-Qn" from a "YYYY-MM" month expression."""
+    quarter = (cast(func.substr(month, 6, 2), Integer) + 2) // 3
+    return func.substr(month, 1, 4, type_=String).concat("-Q").concat(cast(quarter, String))
+
+
+def aggregate_query(fact_table, report_data, measure: str, measure_column: str, dimensions, functions,
+                    dialect_name: str, district=None, month_from=None, month_to=None):
+    """Aggregate every fact row of a template, whatever its approval; the rollups only hold approved rows."""
+    month = month_expression(fact_table.c.date, dialect_name)
+    available = {
+        "district": fact_table.c.district,
+        "month": month,
+        "quarter": quarter_expression(month),
+        "category": report_data.c.category,
+    }
+    groups = [available[d].label(d) for d in dimensions]
+    value = fact_table.c[measure_column]
+    values = {"sum": func.sum(value), "avg": func.avg(value), "min": func.min(value), "max": func.max(value),
+              "count": func.count(value)}
+    query = select(*groups, *[values[f].label(f"{f}_{measure}") for f in functions]).select_from(fact_table)
+    if "category" in dimensions:
+        query = query.join(report_data, report_data.c.id == fact_table.c.report_data_id)
+    if district:
+        query = query.where(fact_table.c.district == district)
+    if month_from:
+        query = query.where(month >= month_from)
+    if month_to:
+        query = query.where(month <= month_to)
+    if groups:
+        query = query.group_by(*groups).order_by(*groups)
+    return query
@@ -0,0 +1,146 @@
+# ingest.py
+# Workbook parsing and validation. Everything here runs inside the parse
+# worker processes, so it must stay importable without main.py and only
+# raise picklable exceptions.
+import os
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from columnar import FRAME_ROW_GROUP_ROWS, to_table
+from storage import atomic_write
+from validation import DATETIME, NUMBER, TEMPLATE_SPECS, ValidationReport, validate_frame
+
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", 50_000))
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def check_district(df: pd.DataFrame, district):
+    if district and (df["District"] != district).any():
+        raise UploadRejected(403, "You can only upload data for your own district")
+
+
+def check_header(header, spec, report_type: str):
+    if not all(col in header for col in spec.column_names):
+        raise UploadRejected(400, f"Invalid {report_type} template")
+
+
+def reject_invalid(report: ValidationReport, report_type: str):
+    if report:
+        raise UploadRejected(400, {"message": f"{report_type} failed validation", "errors": report.as_dict()})
+
+
+def parse_workbook(content, template: str, report_type: str, district=None) -> pd.DataFrame:
+    """Parse, check and validate a whole workbook given as bytes or as a path on disk."""
+    spec = TEMPLATE_SPECS[template]
+    try:
+        df = pd.read_excel(BytesIO(content) if isinstance(content, bytes) else content)
+    except Exception:
+        raise UploadRejected(400, "The uploaded file is not a readable Excel workbook")
+    check_header(df.columns, spec, report_type)
+    check_district(df, district)
+    df, report = validate_frame(df, spec)
+    reject_invalid(report, report_type)
+    return df
+
+
+def template_schema(header, spec) -> pa.Schema:
+    # Every chunk becomes one Parquet row group, so the column types are fixed up front
+    types = {DATETIME: pa.timestamp("us"), NUMBER: pa.float64()}
+    return pa.schema([pa.field(name, types.get(spec.columns.get(name), pa.string())) for name in header])
+
+
+def stringify_extra_columns(df: pd.DataFrame, spec) -> pd.DataFrame:
+    for name in df.columns:
+        if name not in spec.columns:
+            values = df[name]
+            df[name] = values.astype(str).astype(object).where(values.notna(), None)
+    return df
+
+
+def iter_sheet_chunks(path: str, chunk_rows: int = INGEST_CHUNK_ROWS):
+    """Yield the header row, then DataFrames of at most chunk_rows rows, without loading the sheet."""
+    # Open by handle: openpyxl refuses paths without an .xlsx-style extension, and spool files have none
+    handle = open(path, "rb")
+    workbook = load_workbook(handle, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise UploadRejected(400, "The uploaded workbook is empty")
+        # Trailing unnamed columns are formatting leftovers, not data
+        header = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        while header and header[-1].startswith("Unnamed: "):
+            header.pop()
+        yield header
+        width = len(header)
+        batch = []
+        for row in rows:
+            row = row[:width]
+            if all(value is None for value in row):
+                continue
+            batch.append(row + (None,) * (width - len(row)))
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+        handle.close()
+
+
+def ingest_workbook(path: str, frame_path: str, template: str, report_type: str, district=None,
+                    chunk_rows: int = INGEST_CHUNK_ROWS) -> dict:
+    """Check and convert a spooled workbook into the Parquet frame at frame_path, one bounded chunk at a time.
+
+    The header is checked against the template before any data row is read. Every chunk is
+    validated, and the upload is rejected with the failing rows of all chunks at the end.
+    Returns the row count and the District of the first row.
+    """
+    spec = TEMPLATE_SPECS[template]
+    if not zipfile.is_zipfile(path):
+        # Legacy .xls workbooks have no streaming reader; parse them whole
+        df = parse_workbook(path, template, report_type, district)
+        with atomic_write(frame_path) as tmp_path:
+            pq.write_table(to_table(df), tmp_path, row_group_size=FRAME_ROW_GROUP_ROWS)
+        return {"rows": len(df), "district": df["District"].iloc[0] if len(df) else None}
+
+    try:
+        chunks = iter_sheet_chunks(path, chunk_rows)
+        header = next(chunks)
+    except UploadRejected:
+        raise
+    except Exception:
+        raise UploadRejected(400, "The uploaded file is not a readable Excel workbook")
+    check_header(header, spec, report_type)
+    schema = template_schema(header, spec)
+    summary = {"rows": 0, "district": None}
+    report = ValidationReport()
+
+    with atomic_write(frame_path) as tmp_path:
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for chunk in chunks:
+                check_district(chunk, district)
+                if summary["district"] is None:
+                    summary["district"] = chunk["District"].iloc[0]
+                coerced, _ = validate_frame(chunk, spec, report, row_offset=summary["rows"])
+                summary["rows"] += len(chunk)
+                if not report:
+                    # Once a chunk has failed the frame is discarded, so skip the writing
+                    writer.write_table(pa.Table.from_pandas(stringify_extra_columns(coerced, spec), schema=schema,
+                                                            preserve_index=False))
+        if not summary["rows"]:
+            raise UploadRejected(400, "The uploaded workbook has no data rows")
+        reject_invalid(report, report_type)  # raising here leaves any existing frame as it was
+    return summary
@@ -1,135 +1,108 @@
 # main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from enum import Enum
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import base64
+import json
 from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, Date, Text, ForeignKey
+from sqlalchemy import create_engine, select, and_, or_, Column, Index, BigInteger, Integer, String, Date, DateTime, Text, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
-from pydantic import BaseModel, EmailStr
+from sqlalchemy import update, delete, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from fastapi.concurrency import run_in_threadpool
+import os
+import asyncio
+import contextlib
+import uuid
+import weakref
+import time
+import hashlib
+import secrets
+from pydantic import BaseModel, EmailStr, Field
+from io import StringIO
+from storage import blob_store, spool_file, spool_path, discard_spool, hash_file, write_spool_chunk
+import columnar
+import merged as merged_store
+import exports
+from migrations import run_migrations
+from responses import (encode_json, etag_json_response, etag_matches, file_download_response, frame_records, iter_zip,
+                       precompressed_json_response, safe_filename, EncodedJSON, FastJSONResponse, XLSX_MEDIA_TYPE)
+from compression import COMPRESS_MIN_BYTES, CompressionMiddleware, choose_encoding, compress_async
+from fastapi.responses import StreamingResponse, JSONResponse
+from workers import parse_pool, hash_pool, PoolSaturated
+from ingest import ingest_workbook, UploadRejected
+from validation import TEMPLATE_SPECS, template_for
+from facts import aggregate_query, build_fact_tables, iter_fact_batches, measure_columns
+import rollups
+from catalog import (CATALOG_ETAG, CATALOG_GZIP, CATALOG_JSON, CATALOG_VERSION, CheckerStatus,
+                     District, ReportCategory, ReportType, ReviewerStatus, Role)
+from cache import ResponseCache, TTLCache
+from ratelimit import RateLimited, SlidingWindowLimiter
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware)
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse(status_code=503, content={"detail": "Server is busy, please retry shortly"}, headers={"Retry-After": "5"})
+
+@app.exception_handler(UploadRejected)
+async def upload_rejected_handler(request: Request, exc: UploadRejected):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(status_code=429, content={"detail": "Too many login attempts, please retry later"},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    parse_pool.shutdown()
+    hash_pool.shutdown()
 
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 500
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+INGEST_POLL_SECONDS = 5
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 14))
+LOGIN_ATTEMPTS_PER_USER = int(os.environ.get("LOGIN_ATTEMPTS_PER_USER", 5))
+LOGIN_ATTEMPTS_PER_IP = int(os.environ.get("LOGIN_ATTEMPTS_PER_IP", 30))
+LOGIN_WINDOW_SECONDS = 300
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+USER_CACHE_TTL_SECONDS = int(os.environ.get("USER_CACHE_TTL_SECONDS", 300))
+RESUMABLE_UPLOAD_MAX_BYTES = int(os.environ.get("RESUMABLE_UPLOAD_MAX_BYTES", 512 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024  # suggested to clients; small enough to resend cheaply on a flaky link
+UPLOAD_CHUNK_MAX_BYTES = 16 * 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-engine = create_engine("sqlite:///reports.db")
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///reports.db")
+
+def async_database_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+# The sync engine runs migrations, startup bootstrap and the one-shot scripts;
+# request handlers go through the async engine so queries never block the event loop
+engine = create_engine(DATABASE_URL)
+async_engine = create_async_engine(async_database_url(DATABASE_URL))
 Base = declarative_base()
 SessionLocal = sessionmaker(bind=engine)
-
-# Enums
-# report_category e nums
-class ReportCategory(str, Enum):
-    OPERATION = "Operation"
-    FINANCE = "Finance"
-    RISK = "Risk"
-    HR = "HR"
-    IT = "IT"
-
-class ReportType(str, Enum):
-    TRIAL_BALANCE = "Trial Balance OB_TB001"
-    INCOME_STATEMENT = "Income Statement NBE_FIN006"
-    BALANCE_SHEET = "Balance Sheet – Institutional	NBE_FIN004"
-    BREAKDOWN_OF_INCOME_ACCOUNTS = "Breakdown of Income Accounts BRE_INC001"
-    BREAKDOWN_OF__EXPENSES = "Breakdown of Expenses	BRE_EXP001"
-    MONTHLY_AVERAGE_RESERVE_REPORT = "Monthly Average Reserve Report NP024"
-    LIQUIDITY_REQUIREMENT_REPORT = "Liquidity Requirement Report	NBE_FIN003"
-    PROFIT_AND_LOSS_STATEMENT = "Profit and Loss Statement NBE_FIN010"
-    BALANCE_SHEET_NBE = "Balance Sheet – NBE NBE_FIN005"
-    NON_PERFORMING_LOANS_AND_ADVANCES_AND_PROVISIONS = "Non-Performing Loans and Advances & Provisions	NBE_FIN008"
-    LOAN_CLASSIFICATION_AND_PROVISIONING = "Loan Classification and Provisioning NBE_FIN007"
-    FIXED_ASSET = "Fixed Asset / PPE OB_FIN003"
-    CAPITAL_ADEQUACY_REPORT = "Capital Adequacy Report – On-Balance Sheet NBE_FIN011"
-    CAPITAL_ADEQUACY_REPORT_QRTR = "Capital Adequacy Report (Quarterly) – Capital Components NBE_FIN013"
-    MATURITY_OF_ASSETS_AND_LIABILITIES = "Maturity of Assets & Liabilities	NBE_FIN014"
-
-    LOAN_AND_ADVANCE_DISBURSEMENT_COLLECTION_AND_OUTSTANDING = "Loan and Advance Disbursement, Collection and Outstanding NBE_LN001"
-    LOAN_TO_RELATED_PARTIES = "Loan to Related Parties NBE_LN002"
-    BORROWERS_EXCEED_10_PERCENT = "Borrowers Exceed 10 Percent NBE_LN003"
-    PERSONAL_INFORMATION_INDIVIDUAL = "Personal Information Individual NBE_PIF001"
-    INSURANCE_ACTIVITY_REPORT = "Insurance Activity Report OB_INSU01"
-    ARRAERS_BY_AGE_INDIVIDUAL = "Arrears by Age Individual OB_ARR01"
-    ARREARS_BENEFICIARY = "Arrears Beneficiary OB_ARR02"
-
-
-# Parent-Child Mapping
-CATEGORY_REPORT_MAPPING = {
-    ReportCategory.FINANCE: [
-        ReportType.TRIAL_BALANCE,
-        ReportType.INCOME_STATEMENT,
-        ReportType.BALANCE_SHEET,
-        ReportType.BREAKDOWN_OF_INCOME_ACCOUNTS,  
-        ReportType.BREAKDOWN_OF__EXPENSES,
-        ReportType.MONTHLY_AVERAGE_RESERVE_REPORT,
-        ReportType.LIQUIDITY_REQUIREMENT_REPORT,
-        ReportType.PROFIT_AND_LOSS_STATEMENT,
-        ReportType.BALANCE_SHEET_NBE,
-        ReportType.NON_PERFORMING_LOANS_AND_ADVANCES_AND_PROVISIONS,
-        ReportType.LOAN_CLASSIFICATION_AND_PROVISIONING,
-        ReportType.FIXED_ASSET,
-        ReportType.CAPITAL_ADEQUACY_REPORT,
-        ReportType.CAPITAL_ADEQUACY_REPORT,
-        ReportType.CAPITAL_ADEQUACY_REPORT_QRTR,
-        ReportType.MATURITY_OF_ASSETS_AND_LIABILITIES  
-
-    ],
-    ReportCategory.OPERATION:
-        [ReportType.LOAN_AND_ADVANCE_DISBURSEMENT_COLLECTION_AND_OUTSTANDING,
-         ReportType.LOAN_TO_RELATED_PARTIES,
-         ReportType.BORROWERS_EXCEED_10_PERCENT,
-         ReportType.PERSONAL_INFORMATION_INDIVIDUAL,
-         ReportType.INSURANCE_ACTIVITY_REPORT,
-         ReportType.ARRAERS_BY_AGE_INDIVIDUAL,
-         ReportType.ARREARS_BENEFICIARY
-        
-         ]
-   
-}
-class CheckerStatus(str, Enum):
-    PENDING = "Pending"
-    CHECKED = "Checked"
-    REJECTED = "Rejected"
-
-class ReviewerStatus(str, Enum):
-    PENDING = "Pending"
-    APPROVED = "Approved"
-    REJECTED = "Rejected"
-
-class Role(str, Enum):
-    DISTRICT_USER = "district_user"
-    DISTRICT_MANAGER = "district_manager"
-    MAIN_OFFICE = "main_office"
-
-class District(str, Enum):
-    DISTRICT1 = "District1"
-    DISTRICT2 = "District2"
-    DISTRICT3 = "Arbaminch"
-    DISTRICT4 = "Sodo"
-    DISTRICT5 = "Hossana"
-    DISTRICT6 = "Karate"
-    DISTRICT7 = "Bonga"
-    DISTRICT8 = "Jemu"
-    DISTRICT9 = "Dilla"
-    DISTRICT10 = "Masha"
-    DISTRICT11 = "Bonga"
-    District12 = "Tarcha"
-    DISTRICT13 = "Mizan"
-    DISTRICT14 = "Hawassa Sidama"
-    DISTRICT15 = "Worabe"
-    DISTRICT16 = "Sawla"
-    DISTRICT17 = "Welkite"
-    District18 = "Jinka"
-    DISTRICT19 = "Hawassa Ketema"
-    DISTRICT20 = "Durame"
-    DISTRIct21 = "Halaba"
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 # Database Models
 class ReportData(Base):
@@ -138,26 +111,32 @@ class ReportData(Base):
     report_type = Column(String)
     report_code = Column(String, unique=True)
     category = Column(String)
-    district = Column(String)
-    data_json = Column(Text)
-    file_content = Column(Text)
+    district = Column(String, index=True)
+    data_json = Column(Text, nullable=True)  # legacy records JSON, replaced by the Parquet frame
+    file_content = Column(Text, nullable=True)  # legacy hex storage, emptied by migrate_blobs.py
+    file_sha256 = Column(String(64), nullable=True, index=True)
     report_metadata = relationship("ReportMetadata", back_populates="data", uselist=False)
 
 class ReportMetadata(Base):
     __tablename__ = "report_metadata"
     id = Column(Integer, primary_key=True)
-    report_data_id = Column(Integer, ForeignKey("report_data.id"), nullable=False)
+    report_data_id = Column(Integer, ForeignKey("report_data.id"), nullable=False, index=True)
     report_type = Column(String)
-    report_code = Column(String)
+    report_code = Column(String, index=True)
+    district = Column(String)  # copy of report_data.district for the listing index
     title = Column(String)
     description = Column(String)
     prepared_by = Column(String)
     created_date = Column(Date)
     checker_status = Column(String, default="Pending")
-    reviewer_status = Column(String, default="Pending")
+    reviewer_status = Column(String, default="Pending", index=True)
     checker_comment = Column(String, nullable=True)
     reviewer_comment = Column(String, nullable=True)
     data = relationship("ReportData", back_populates="report_metadata")
+    __table_args__ = (
+        Index("ix_report_metadata_district_created", "district", "created_date", "id"),
+        Index("ix_report_metadata_created", "created_date", "id"),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -170,7 +149,66 @@ class User(Base):
     role = Column(String, nullable=False)
     district = Column(String, nullable=True)
 
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), unique=True, nullable=False)  # sha256 of the token; the token itself is never stored
+    username = Column(String, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    id = Column(String(32), primary_key=True)
+    status = Column(String, nullable=False, default=JobStatus.QUEUED.value, index=True)
+    stage = Column(String, nullable=True)
+    report_type = Column(String, nullable=False)
+    report_code = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    description = Column(String, nullable=False)
+    district = Column(String, nullable=True)  # district the rows must belong to, None for main office
+    prepared_by = Column(String, nullable=False)
+    spool_path = Column(String, nullable=False)
+    file_sha256 = Column(String(64), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    id = Column(String(32), primary_key=True)
+    username = Column(String, nullable=False, index=True)
+    report_type = Column(String, nullable=False)
+    report_code = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    description = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, nullable=False, default=0)  # bytes on disk; the next chunk must start here
+    sha256 = Column(String(64), nullable=True)  # of the whole file, as declared by the client
+    spool_path = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+class MergedReport(Base):
+    __tablename__ = "merged_reports"
+    report_type = Column(String, primary_key=True)
+    row_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+
+FACT_TABLES = build_fact_tables(Base.metadata)
+ROLLUP_TABLE = rollups.build_rollup_table(Base.metadata)
+
 Base.metadata.create_all(engine)
+run_migrations(engine)
 
 # Pydantic Models
 class UserCreate(BaseModel):
@@ -193,6 +231,9 @@ class UserResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class ReportUpload(BaseModel):
     report_type: ReportType
     report_code: str
@@ -200,142 +241,805 @@ class ReportUpload(BaseModel):
     description: str
     category: ReportCategory
 
+class UploadSessionCreate(ReportUpload):
+    size: int = Field(..., gt=0, le=RESUMABLE_UPLOAD_MAX_BYTES)
+    sha256: str = Field(..., pattern=r"^[0-9a-f]{64}$")  # of the whole file, checked when the upload completes
+
 class ReportUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
 
+class ReportFilter(BaseModel):
+    district: Optional[District] = None
+    category: Optional[ReportCategory] = None
+    report_type: Optional[ReportType] = None
+    checker_status: Optional[CheckerStatus] = None
+    reviewer_status: Optional[ReviewerStatus] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    cursor: Optional[str] = None
+    limit: int = Field(100, ge=1, le=MAX_PAGE_SIZE)
+
+class AnalyticsDimension(str, Enum):
+    DISTRICT = "district"
+    MONTH = "month"
+    QUARTER = "quarter"
+    CATEGORY = "category"
+
+class AnalyticsFunction(str, Enum):
+    SUM = "sum"
+    AVG = "avg"
+    MIN = "min"
+    MAX = "max"
+    COUNT = "count"
+
+class DuplicatePolicy(str, Enum):
+    REJECT = "reject"
+    LINK = "link"
+
+class ExportFormat(str, Enum):
+    XLSX = "xlsx"
+    CSV = "csv"
+    PARQUET = "parquet"
+
+class ReportExport(BaseModel):
+    report_codes: List[str]
+
 class StatusUpdate(BaseModel):
     checker_status: Optional[CheckerStatus] = None
     reviewer_status: Optional[ReviewerStatus] = None
     comment: Optional[str] = None
 
-REPORT_TEMPLATES = {
-    "balance_sheet": ["District", "Date", "Assets", "Liabilities", "Equity"],
-    "income_statement": ["District", "Date", "Revenue", "Expenses", "Net_Income"],
-    "cash_flow": ["District", "Date", "Cash_In", "Cash_Out", "Net_Cash"]
-}
+class BatchStatusUpdate(StatusUpdate):
+    report_codes: List[str]
+
+class BatchDelete(BaseModel):
+    report_codes: List[str]
+
+def load_report_frame(report_data, columns=None):
+    if columnar.has_frame(report_data.file_sha256):
+        return columnar.read_frame(report_data.file_sha256, columns)
+    df = pd.read_json(StringIO(report_data.data_json), orient="records")
+    return df[columns] if columns else df
+
+def refresh_merged(db: Session, report_type: str, row_count: int):
+    entry = db.query(MergedReport).filter(MergedReport.report_type == report_type).first()
+    if row_count == 0:
+        if entry:
+            db.delete(entry)
+        return
+    if not entry:
+        entry = MergedReport(report_type=report_type)
+        db.add(entry)
+    entry.row_count = row_count
+    entry.updated_at = datetime.now()
+
+merge_locks = weakref.WeakValueDictionary()  # report_code -> lock held while its partition is synced
+
+def merge_lock(report_code: str) -> asyncio.Lock:
+    lock = merge_locks.get(report_code)
+    if lock is None:
+        lock = merge_locks[report_code] = asyncio.Lock()
+    return lock
 
-def get_db():
-    db = SessionLocal()
+async def sync_merged(db: AsyncSession, reports):
+    """Bring the merge partitions of reports in line with their committed approval; call after db.commit().
+
+    Each report's lock is held from reading its approval back until its partition is written or
+    removed, so when two requests of this process flip the same report the files follow whichever
+    commit came last. Other server processes are not serialised; bootstrap_merged repairs on start.
+    """
+    if not reports:
+        return
+    async with contextlib.AsyncExitStack() as locks:
+        for report_code in sorted({rd.report_code for rd in reports}):  # one order, so two syncs cannot deadlock
+            await locks.enter_async_context(merge_lock(report_code))
+        approved_ids = set((await db.execute(select(ReportMetadata.report_data_id).where(
+            ReportMetadata.report_data_id.in_([rd.id for rd in reports]),
+            ReportMetadata.reviewer_status == ReviewerStatus.APPROVED.value))).scalars())
+        changes = {}
+        for report_data in reports:
+            added, removed_codes = changes.setdefault(report_data.report_type, ([], []))
+            (added if report_data.id in approved_ids else removed_codes).append(report_data)
+        for report_type, (added, removed) in changes.items():
+            # A report's rows never change, so a partition already written is left alone
+            present = await run_in_threadpool(merged_store.report_codes, report_type)
+            added = [rd for rd in added if rd.report_code not in present]
+            removed = [rd.report_code for rd in removed if rd.report_code in present]
+            if not added and not removed:
+                continue
+            frames = [(rd.report_code, await run_in_threadpool(load_report_frame, rd)) for rd in added]
+            row_count = await run_in_threadpool(merged_store.update_reports, report_type, frames, removed)
+            await db.run_sync(refresh_merged, report_type, row_count)
+        await db.commit()
+
+def encode_cursor(created_date: date, report_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_date.isoformat()}|{report_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
     try:
+        created_date, report_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(created_date), int(report_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await hash_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+async def hash_password(password):
+    return await hash_pool.run(pwd_context.hash, password)
 
-def get_user(username: str, db: Session):
-    return db.query(User).filter(User.username == username).first()
+async def get_user(username: str, db: AsyncSession):
+    return (await db.execute(select(User).where(User.username == username))).scalars().first()
 
-def authenticate_user(username: str, password: str, db: Session):
-    user = get_user(username, db)
-    if not user or not verify_password(password, user.hashed_password):
+# Tokens carry role and district, so authentication normally never reads users.
+# The cache serves /me and tokens issued before the claims existed.
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+user_changed_at = {}
+
+def user_profile(user: User) -> dict:
+    return {name: getattr(user, name) for name in UserResponse.__annotations__}
+
+async def get_user_profile(username: str, db: AsyncSession):
+    profile = user_cache.get(username)
+    if profile is None:
+        user = await get_user(username, db)
+        if user is None:
+            return None
+        profile = user_profile(user)
+        user_cache.set(username, profile)
+    return profile
+
+def invalidate_user(username: str):
+    """Drop a changed or deleted user from the cache and reject the tokens issued to them so far."""
+    user_cache.pop(username)
+    # iat has whole-second resolution; a token from the same second as the change stays valid
+    user_changed_at[username] = int(time.time())
+
+# Read endpoints keep their encoded JSON keyed by path, query and the caller's role
+# and district. Writes invalidate by tag: "reports", "merged", "users".
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+cache_builds = {}  # (key, generation) -> Future of the build running for it
+
+async def cached_json(request: Request, current_user: Optional[dict], tags, build):
+    """Serve the JSON of await build() through the response cache, with a strong ETag.
+
+    A build with a large result should return encode_json(...) computed off the event loop.
+    """
+    key = (request.url.path, str(request.query_params),
+           current_user and current_user["role"], current_user and current_user["district"])
+    entry = response_cache.get(key)
+    if entry is None:
+        # Concurrent misses share one build; only a build started after the last invalidation is joined
+        generation = response_cache.generation
+        building = cache_builds.get((key, generation))
+        if building is not None:
+            entry = await asyncio.shield(building)
+        else:
+            building = cache_builds[key, generation] = asyncio.get_running_loop().create_future()
+            try:
+                content = await build()
+                entry = content if isinstance(content, EncodedJSON) else encode_json(content)
+                building.set_result(entry)
+            except Exception as e:
+                building.set_exception(e)
+                building.exception()  # retrieved here, so an unjoined failure is not logged twice
+                raise
+            finally:
+                if not building.done():
+                    building.cancel()  # the building request was cancelled; joiners see CancelledError
+                del cache_builds[key, generation]
+            response_cache.put(key, entry.etag, entry.body, tags, generation)
+    etag, body = entry
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES or etag_matches(request, etag):
+        return etag_json_response(request, body, etag)
+    # The compressed copy is cached next to the body, so a hit does not compress again
+    encoded = response_cache.get_encoded(key, etag, encoding)
+    if encoded is None:
+        encoded = await compress_async(body, encoding)
+        response_cache.put_encoded(key, etag, encoding, encoded)
+    return etag_json_response(request, encoded, etag, content_encoding=encoding)
+
+async def get_report_metadata(report_code: str, db: AsyncSession):
+    return (await db.execute(select(ReportMetadata).where(ReportMetadata.report_code == report_code))).scalars().first()
+
+async def get_report_data(report_code: str, db: AsyncSession):
+    return (await db.execute(select(ReportData).where(ReportData.report_code == report_code))).scalars().first()
+
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = await get_user(username, db)
+    if not user or not await verify_password(password, user.hashed_password):
         return False
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        user = get_user(username, db)
-        if user is None:
+        if payload.get("iat", 0) < user_changed_at.get(username, 0):
+            raise credentials_exception
+        if "role" in payload:
+            return {"username": username, "role": payload["role"], "district": payload.get("district")}
+        profile = await get_user_profile(username, db)
+        if profile is None:
             raise credentials_exception
-        return {"username": user.username, "role": user.role, "district": user.district}
+        return {"username": username, "role": profile["role"], "district": profile["district"]}
     except JWTError:
         raise credentials_exception
 
+# Refresh tokens are random strings; only their sha256 is stored, so a leaked
+# table cannot be replayed. Each refresh revokes the presented token and issues a new one.
+user_login_limiter = SlidingWindowLimiter(LOGIN_ATTEMPTS_PER_USER, LOGIN_WINDOW_SECONDS)
+ip_login_limiter = SlidingWindowLimiter(LOGIN_ATTEMPTS_PER_IP, LOGIN_WINDOW_SECONDS)
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def issue_tokens(db: AsyncSession, username: str, role: str, district: Optional[str]):
+    refresh_token = secrets.token_urlsafe(32)
+    now = datetime.now()
+    db.add(RefreshToken(token_hash=hash_refresh_token(refresh_token), username=username, created_at=now,
+                        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)))
+    await db.commit()
+    access_token = create_access_token(data={"sub": username, "role": role, "district": district},
+                                       expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+async def revoke_refresh_tokens(db: AsyncSession, username: str):
+    await db.execute(update(RefreshToken).where(RefreshToken.username == username, RefreshToken.revoked_at.is_(None))
+                     .values(revoked_at=datetime.now()))
 
 @app.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    # Every Streamlit user logs in from the Streamlit host, so only failures count against an address
+    client_host = request.client.host if request.client else None
+    ip_login_limiter.check(client_host)
+    user_login_limiter.hit(form_data.username)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
+        ip_login_limiter.record(client_host)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
-    access_token = create_access_token(data={"sub": user.username}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    return {"access_token": access_token, "token_type": "bearer"}
+    user_login_limiter.reset(form_data.username)
+    user_cache.set(user.username, user_profile(user))
+    return await issue_tokens(db, user.username, user.role, user.district)
+
+@app.post("/token/refresh")
+async def refresh_access_token(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    invalid = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    token = (await db.execute(select(RefreshToken).where(
+        RefreshToken.token_hash == hash_refresh_token(body.refresh_token)))).scalars().first()
+    if token is None:
+        raise invalid
+    if token.revoked_at is not None:
+        # A rotated token came back: assume it was stolen and end every session of the user
+        await revoke_refresh_tokens(db, token.username)
+        await db.commit()
+        raise invalid
+    if token.expires_at <= datetime.now() or token.created_at.timestamp() < user_changed_at.get(token.username, 0):
+        raise invalid
+    profile = await get_user_profile(token.username, db)
+    if profile is None:
+        raise invalid
+    token.revoked_at = datetime.now()
+    return await issue_tokens(db, token.username, profile["role"], profile["district"])
+
+@app.post("/token/revoke", status_code=204)
+async def revoke_refresh_token(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    await db.execute(update(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(body.refresh_token),
+                                                RefreshToken.revoked_at.is_(None)).values(revoked_at=datetime.now()))
+    await db.commit()
 
 @app.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = get_user(current_user["username"], db)
-    return user
+async def get_current_user_info(current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    profile = await get_user_profile(current_user["username"], db)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return profile
 
 # Expose enums via endpoint
+# The catalog only changes with a deploy. /enums/ is revalidated by ETag on every
+# use; /enums/{version} never changes, so clients may keep it indefinitely.
 @app.get("/enums/")
-async def get_enums():
-    return {
-        "categories": [category.value for category in ReportCategory],
-        "report_types": [report_type.value for report_type in ReportType],
-        "category_report_mapping": {
-            category.value: [rt.value for rt in report_type]
-            for category, report_type in CATEGORY_REPORT_MAPPING.items()
-        }
-    }
+async def get_enums(request: Request):
+    return precompressed_json_response(request, CATALOG_JSON, CATALOG_GZIP, CATALOG_ETAG, "no-cache")
 
-@app.post("/upload/")
-async def upload_file(
-    report: ReportUpload = Depends(),
-    file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    if current_user["role"] not in ["district_user", "main_office"]:
-        raise HTTPException(status_code=403, detail="Only district users or main office can upload reports")
-    
-    district = current_user["district"] if current_user["role"] == "district_user" else None
-    df = pd.read_excel(file.file)
-    expected_columns = REPORT_TEMPLATES[report.report_type.value]
-    if not all(col in df.columns for col in expected_columns):
-        raise HTTPException(status_code=400, detail=f"Invalid {report.report_type.value} template")
-    if district and not all(df["District"] == district):
-        raise HTTPException(status_code=403, detail="You can only upload data for your own district")
+@app.get("/enums/{version}")
+async def get_enums_version(version: str, request: Request):
+    if version != CATALOG_VERSION:
+        raise HTTPException(status_code=404, detail=f"Catalog version is {CATALOG_VERSION}")
+    return precompressed_json_response(request, CATALOG_JSON, CATALOG_GZIP, CATALOG_ETAG,
+                                       "public, max-age=31536000, immutable")
 
-    if db.query(ReportData).filter(ReportData.report_code == report.report_code).first():
-        raise HTTPException(status_code=400, detail="Report code already exists")
+async def ingest_spooled(path: str, file_sha256: str, report_type: str, district):
+    """Validate a spooled upload into its Parquet frame, then move the workbook into the blob store."""
+    spec = template_for(report_type)
+    if spec is None:
+        raise UploadRejected(400, f"No upload template is defined for {report_type}")
+    summary = await parse_pool.run(ingest_workbook, path, columnar.frame_path(file_sha256),
+                                   spec.name, report_type, district)
+    await run_in_threadpool(blob_store.put_path, path, file_sha256)
+    return summary
+
+async def insert_facts(db: AsyncSession, report_data):
+    spec = template_for(report_data.report_type)
+    if spec is None or not columnar.has_frame(report_data.file_sha256):
+        return 0
+    table = FACT_TABLES[spec.name]
+    batches = iter_fact_batches(columnar.frame_path(report_data.file_sha256), spec, report_data.id, report_data.report_code)
+    inserted = 0
+    while True:
+        rows = await run_in_threadpool(next, batches, None)
+        if rows is None:
+            return inserted
+        if async_engine.dialect.name == "postgresql":
+            # COPY is several times faster than a multi-row INSERT on Postgres
+            columns = list(rows[0])
+            raw = await (await db.connection()).get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                table.name, records=[tuple(row[c] for c in columns) for row in rows], columns=columns)
+        else:
+            await db.execute(table.insert(), rows)  # executemany
+        inserted += len(rows)
+
+async def delete_facts(db: AsyncSession, report_data):
+    spec = template_for(report_data.report_type)
+    if spec is not None:
+        table = FACT_TABLES[spec.name]
+        await db.execute(delete(table).where(table.c.report_data_id == report_data.id))
+
+async def rollup_keys(db: AsyncSession, reports):
+    """Template -> (district, month) keys the reports' facts fall in; read them before the facts are deleted."""
+    ids_by_template = {}
+    for report_data in reports:
+        spec = template_for(report_data.report_type)
+        if spec is not None:
+            ids_by_template.setdefault(spec.name, []).append(report_data.id)
+    keys = {}
+    for template, ids in ids_by_template.items():
+        query = rollups.report_keys_query(FACT_TABLES[template], ids, async_engine.dialect.name)
+        keys[template] = [tuple(row) for row in (await db.execute(query)).all()]
+    return keys
+
+async def refresh_rollups(db: AsyncSession, keys):
+    """Recompute the rollup groups in keys (from rollup_keys); call after the approval changes are flushed."""
+    for template, template_keys in keys.items():
+        spec = TEMPLATE_SPECS[template]
+        for statement in rollups.refresh_statements(ROLLUP_TABLE, FACT_TABLES[template], template, spec,
+                                                    ReportData.__table__, ReportMetadata.__table__,
+                                                    ReviewerStatus.APPROVED.value, async_engine.dialect.name,
+                                                    template_keys):
+            await db.execute(statement)
 
-    file_content = file.file.read()
+async def store_report(db: AsyncSession, report: ReportUpload, prepared_by: str, file_sha256: str, district: str):
     report_data = ReportData(
         report_type=report.report_type.value,
         report_code=report.report_code,
         category=report.category.value,
-        district=df["District"].iloc[0],
-        data_json=df.to_json(orient="records"),
-        file_content=file_content.hex()
+        district=district,
+        file_sha256=file_sha256
     )
     db.add(report_data)
-    db.flush()  # Ensure report_data.id is generated
+    await db.flush()  # Ensure report_data.id is generated
     
     metadata = ReportMetadata(
         report_data_id=report_data.id,
         report_type=report.report_type.value,
         report_code=report.report_code,
+        district=report_data.district,
         title=report.title,
         description=report.description,
-        prepared_by=current_user["username"],
+        prepared_by=prepared_by,
         created_date=datetime.now(),
         checker_status=CheckerStatus.PENDING.value,
         reviewer_status=ReviewerStatus.PENDING.value
     )
     db.add(metadata)
-    db.commit()
+    await insert_facts(db, report_data)
+    await lock_blob(db, file_sha256)
+    if not (blob_store.exists(file_sha256) and columnar.has_frame(file_sha256)):
+        # The last report sharing these files was deleted meanwhile and took them along
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="The stored workbook was deleted meanwhile; please upload it again")
+    await db.commit()
+    response_cache.invalidate("reports")
+
+async def lock_blob(db: AsyncSession, file_sha256: str):
+    """Serialise reference changes to one blob until the current transaction ends.
+
+    SQLite has one writer at a time, so a transaction that has already written holds this
+    implicitly; Postgres takes a transaction-level advisory lock keyed by the hash.
+    """
+    if async_engine.dialect.name == "postgresql":
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(file_sha256, 0))))
+
+async def release_blobs(db: AsyncSession, shas):
+    """Delete the blobs, frames included, that no report references any more; call before committing the deletion.
+
+    The files go while the blob locks are held, so an upload linking one of them either
+    committed first and keeps it, or finds it gone in store_report.
+    """
+    shas = {sha256 for sha256 in shas if sha256}
+    for sha256 in sorted(shas):  # one order, so two deletions cannot deadlock
+        await lock_blob(db, sha256)
+    if not shas:
+        return
+    referenced = set((await db.execute(select(ReportData.file_sha256).where(ReportData.file_sha256.in_(shas)))).scalars())
+    for sha256 in shas - referenced:
+        await run_in_threadpool(blob_store.delete, sha256)
+
+async def find_duplicate(db: AsyncSession, file_sha256: str):
+    """The first stored report whose workbook has the same bytes, if any."""
+    return (await db.execute(select(ReportData.report_code, ReportData.report_type, ReportData.district)
+                             .where(ReportData.file_sha256 == file_sha256).order_by(ReportData.id).limit(1))).first()
+
+def can_link(duplicate, report_type: str, file_sha256: str) -> bool:
+    # Legacy reports may have a blob but no parsed frame; those still go through ingest
+    return duplicate.report_type == report_type and columnar.has_frame(file_sha256) and blob_store.exists(file_sha256)
+
+async def check_duplicate(db: AsyncSession, report: ReportUpload, file_sha256: str, policy: DuplicatePolicy, district):
+    """Reject an upload whose bytes are already stored, or return the report it can share blob and frame with."""
+    duplicate = await find_duplicate(db, file_sha256)
+    if duplicate is None:
+        return None
+    if district and duplicate.district != district:
+        raise HTTPException(status_code=403, detail="You can only upload data for your own district")
+    if policy == DuplicatePolicy.LINK and can_link(duplicate, report.report_type.value, file_sha256):
+        return duplicate
+    raise HTTPException(status_code=409, detail={
+        "message": f"This workbook was already uploaded as '{duplicate.report_code}'",
+        "report_code": duplicate.report_code,
+    })
+
+@app.post("/upload/")
+async def upload_file(
+    response: Response,
+    report: ReportUpload = Depends(),
+    file: UploadFile = File(...),
+    background: bool = False,
+    duplicates: DuplicatePolicy = DuplicatePolicy.REJECT,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if current_user["role"] not in ["district_user", "main_office"]:
+        raise HTTPException(status_code=403, detail="Only district users or main office can upload reports")
+    
+    district = current_user["district"] if current_user["role"] == "district_user" else None
+    if template_for(report.report_type.value) is None:
+        raise HTTPException(status_code=400, detail=f"No upload template is defined for {report.report_type.value}")
+    if await get_report_data(report.report_code, db):
+        raise HTTPException(status_code=400, detail="Report code already exists")
+
+    path = spool_path(f"{uuid.uuid4().hex}.upload")
+    _, file_sha256 = await run_in_threadpool(spool_file, file.file, path)
+    try:
+        return await ingest_upload(db, response, report, path, file_sha256, district, current_user["username"],
+                                   background, duplicates)
+    except PoolSaturated:
+        await run_in_threadpool(discard_spool, path)
+        raise
+
+async def ingest_upload(db: AsyncSession, response: Response, report: ReportUpload, path: str, file_sha256: str,
+                        district, prepared_by: str, background: bool, duplicates: DuplicatePolicy):
+    """Store a spooled, hashed upload: link or reject a duplicate, queue it, or parse it now.
+
+    The spool file is consumed on every outcome except PoolSaturated, which leaves it for a retry.
+    """
+    try:
+        if await get_report_data(report.report_code, db):
+            raise HTTPException(status_code=400, detail="Report code already exists")
+        duplicate = await check_duplicate(db, report, file_sha256, duplicates, district)
+        if duplicate:
+            # Same bytes, same template: the stored blob and frame are reused, nothing is parsed
+            await store_report(db, report, prepared_by, file_sha256, duplicate.district)
+            return {"message": f"Report '{report.report_code}' uploaded as a copy of '{duplicate.report_code}'",
+                    "duplicate_of": duplicate.report_code}
+        if background:
+            job = await enqueue_ingest(db, report, path, file_sha256, district, prepared_by, duplicates)
+            path = None  # the job owns the spool file now
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"job_id": job.id, "status": job.status, "message": f"Report '{report.report_code}' queued for processing"}
+        summary = await ingest_spooled(path, file_sha256, report.report_type.value, district)
+    except PoolSaturated:
+        path = None
+        raise
+    finally:
+        if path:
+            await run_in_threadpool(discard_spool, path)
+    await store_report(db, report, prepared_by, file_sha256, summary["district"])
     return {"message": f"Report '{report.report_code}' uploaded successfully"}
 
+# Resumable uploads: a session row tracks how many bytes of the spool file are
+# on disk. Chunks are PUT in order with their sha256; a dropped connection
+# resumes from GET /uploads/{id}'s offset, and completing hands the spool file
+# to the same path as POST /upload/.
+def upload_session_state(upload: UploadSession):
+    return {
+        "upload_id": upload.id,
+        "report_code": upload.report_code,
+        "size": upload.size,
+        "offset": upload.received,
+        "chunk_size": UPLOAD_CHUNK_BYTES,
+        "expires_at": upload.updated_at + timedelta(hours=UPLOAD_SESSION_TTL_HOURS),
+    }
+
+async def get_upload_session(db: AsyncSession, upload_id: str, current_user: dict) -> UploadSession:
+    upload = await db.get(UploadSession, upload_id)
+    if not upload or upload.username != current_user["username"]:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return upload
+
+async def drop_upload_session(db: AsyncSession, upload: UploadSession):
+    await db.execute(delete(UploadSession).where(UploadSession.id == upload.id))
+    await db.commit()
+    await run_in_threadpool(discard_spool, upload.spool_path)
+
+async def expire_upload_sessions(db: AsyncSession):
+    cutoff = datetime.now() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    for upload in (await db.execute(select(UploadSession).where(UploadSession.updated_at < cutoff))).scalars().all():
+        await drop_upload_session(db, upload)
+
+@app.post("/uploads/", status_code=201)
+async def create_upload_session(upload: UploadSessionCreate, current_user: dict = Depends(get_current_user),
+                                db: AsyncSession = Depends(get_db)):
+    if current_user["role"] not in ["district_user", "main_office"]:
+        raise HTTPException(status_code=403, detail="Only district users or main office can upload reports")
+    if template_for(upload.report_type.value) is None:
+        raise HTTPException(status_code=400, detail=f"No upload template is defined for {upload.report_type.value}")
+    if await get_report_data(upload.report_code, db):
+        raise HTTPException(status_code=400, detail="Report code already exists")
+
+    await expire_upload_sessions(db)
+    upload_id = uuid.uuid4().hex
+    path = spool_path(f"{upload_id}.part")
+    await run_in_threadpool(write_spool_chunk, path, 0, b"")
+    now = datetime.now()
+    session = UploadSession(id=upload_id, username=current_user["username"], report_type=upload.report_type.value,
+                            report_code=upload.report_code, category=upload.category.value, title=upload.title,
+                            description=upload.description, size=upload.size, received=0, sha256=upload.sha256,
+                            spool_path=path, created_at=now, updated_at=now)
+    db.add(session)
+    await db.commit()
+    return upload_session_state(session)
+
+@app.get("/uploads/{upload_id}")
+async def get_upload_session_state(upload_id: str, current_user: dict = Depends(get_current_user),
+                                   db: AsyncSession = Depends(get_db)):
+    return upload_session_state(await get_upload_session(db, upload_id, current_user))
+
+@app.put("/uploads/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    chunk_sha256: str = Header(..., alias="X-Chunk-SHA256"),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    upload = await get_upload_session(db, upload_id, current_user)
+    if offset != upload.received:
+        raise HTTPException(status_code=409, detail={"message": f"Expected the chunk at offset {upload.received}",
+                                                     "offset": upload.received})
+    data = bytearray()
+    async for part in request.stream():
+        data += part
+        if len(data) > UPLOAD_CHUNK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Chunks are limited to {UPLOAD_CHUNK_MAX_BYTES} bytes")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty chunk")
+    if offset + len(data) > upload.size:
+        raise HTTPException(status_code=400, detail=f"Chunk runs past the declared size of {upload.size} bytes")
+    if (await run_in_threadpool(hashlib.sha256, data)).hexdigest() != chunk_sha256.lower():
+        raise HTTPException(status_code=400, detail="Chunk checksum mismatch; resend the chunk")
+
+    # Claim the byte range before touching the file: of two racing PUTs for one offset, the loser writes nothing
+    claimed = await db.execute(update(UploadSession).where(UploadSession.id == upload.id, UploadSession.received == offset)
+                               .values(received=offset + len(data), updated_at=datetime.now()))
+    await db.commit()
+    if claimed.rowcount != 1:
+        await db.refresh(upload)
+        raise HTTPException(status_code=409, detail={"message": "Another chunk was written at this offset",
+                                                     "offset": upload.received})
+    try:
+        await run_in_threadpool(write_spool_chunk, upload.spool_path, offset, data)
+    except Exception:
+        await db.execute(update(UploadSession).where(UploadSession.id == upload.id,
+                                                     UploadSession.received == offset + len(data)).values(received=offset))
+        await db.commit()
+        raise
+    await db.refresh(upload)
+    return upload_session_state(upload)
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    response: Response,
+    background: bool = False,
+    duplicates: DuplicatePolicy = DuplicatePolicy.REJECT,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    upload = await get_upload_session(db, upload_id, current_user)
+    if upload.received != upload.size:
+        raise HTTPException(status_code=409, detail={"message": f"Upload is incomplete: {upload.received} of {upload.size} bytes",
+                                                     "offset": upload.received})
+    on_disk = await run_in_threadpool(os.path.getsize, upload.spool_path)
+    if on_disk < upload.size:
+        # A range was claimed but its write never landed (the server stopped in between); resume from the file
+        upload.received = on_disk
+        await db.commit()
+        raise HTTPException(status_code=409, detail={"message": f"Upload is incomplete: {on_disk} of {upload.size} bytes",
+                                                     "offset": on_disk})
+    file_sha256 = await run_in_threadpool(hash_file, upload.spool_path)
+    if file_sha256 != upload.sha256:
+        await drop_upload_session(db, upload)
+        raise HTTPException(status_code=400, detail="The uploaded file does not match its declared sha256; upload it again")
+
+    district = current_user["district"] if current_user["role"] == "district_user" else None
+    report = ReportUpload(report_type=upload.report_type, report_code=upload.report_code, title=upload.title,
+                          description=upload.description, category=upload.category)
+    keep = False
+    try:
+        return await ingest_upload(db, response, report, upload.spool_path, file_sha256, district,
+                                   current_user["username"], background, duplicates)
+    except PoolSaturated:
+        keep = True  # the spool is still in place; completing again retries the parse
+        raise
+    finally:
+        if not keep:
+            await db.rollback()
+            await db.execute(delete(UploadSession).where(UploadSession.id == upload_id))
+            await db.commit()
+
+@app.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    await drop_upload_session(db, await get_upload_session(db, upload_id, current_user))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    job = await db.get(IngestJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if current_user["role"] != "main_office" and job.prepared_by != current_user["username"]:
+        raise HTTPException(status_code=403, detail="You can only view your own jobs")
+    error = job.error
+    if error and error.startswith("{"):
+        error = json.loads(error)  # structured validation report
+    return {"job_id": job.id, "status": job.status, "stage": job.stage, "report_code": job.report_code,
+            "error": error, "created_at": job.created_at, "updated_at": job.updated_at}
+
+# Batch endpoints check the whole set with one query and apply every allowed
+# item in one transaction; items that fail a check are reported, not fatal.
+# They are declared before /reports/{report_code}/... so "batch" is not taken for a code.
+def batch_codes(report_codes: List[str]) -> List[str]:
+    codes = list(dict.fromkeys(report_codes))
+    if not codes:
+        raise HTTPException(status_code=400, detail="No report codes given")
+    if len(codes) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} reports per batch")
+    return codes
+
+async def load_batch(db: AsyncSession, codes: List[str]):
+    """report_code -> (metadata, report_data, district of the preparer) for the codes that exist."""
+    rows = (await db.execute(
+        select(ReportMetadata, ReportData, User.district)
+        .join(ReportData, ReportMetadata.report_data_id == ReportData.id)
+        .outerjoin(User, User.username == ReportMetadata.prepared_by)
+        .where(ReportMetadata.report_code.in_(codes))
+    )).all()
+    return {metadata.report_code: (metadata, report_data, preparer_district) for metadata, report_data, preparer_district in rows}
+
+def batch_result(report_code: str, status_code: int, detail: str) -> dict:
+    return {"report_code": report_code, "status": status_code, "detail": detail}
+
+@app.post("/reports/batch/status")
+async def batch_update_status(
+    batch: BatchStatusUpdate,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    codes = batch_codes(batch.report_codes)
+    if not batch.checker_status and not batch.reviewer_status:
+        raise HTTPException(status_code=400, detail="No status given")
+    if batch.checker_status and current_user["role"] != "district_manager":
+        raise HTTPException(status_code=403, detail="Only district managers can update checker status")
+    if batch.reviewer_status and current_user["role"] != "main_office":
+        raise HTTPException(status_code=403, detail="Only main office can update reviewer status")
+
+    found = await load_batch(db, codes)
+    results, approved, withdrawn, decided = [], [], [], []
+    for code in codes:
+        if code not in found:
+            results.append(batch_result(code, 404, "Report not found"))
+            continue
+        metadata, report_data, preparer_district = found[code]
+        if batch.checker_status:
+            if preparer_district != current_user["district"]:
+                results.append(batch_result(code, 403, "You can only update reports from your district"))
+                continue
+            metadata.checker_status = batch.checker_status.value
+            metadata.checker_comment = batch.comment if batch.checker_status == CheckerStatus.REJECTED else None
+        if batch.reviewer_status:
+            was_approved = metadata.reviewer_status == ReviewerStatus.APPROVED.value
+            is_approved = batch.reviewer_status == ReviewerStatus.APPROVED
+            metadata.reviewer_status = batch.reviewer_status.value
+            metadata.reviewer_comment = batch.comment if batch.reviewer_status == ReviewerStatus.REJECTED else None
+            if is_approved != was_approved:
+                (approved if is_approved else withdrawn).append(report_data)
+            decided.append(report_data)  # was_approved may be stale; the merge follows every reviewer decision
+        results.append(batch_result(code, 200, "Status updated"))
+
+    if approved or withdrawn:
+        await db.flush()
+        await refresh_rollups(db, await rollup_keys(db, approved + withdrawn))
+    await db.commit()
+    await sync_merged(db, decided)
+    response_cache.invalidate("reports", "merged")
+    return {"updated": sum(r["status"] == 200 for r in results), "results": results}
+
+LOCKED_REPORT_DETAIL = "Checked or approved reports cannot be deleted"
+
+def is_locked(metadata) -> bool:
+    # Approved reports feed the merge and the rollups; they must be withdrawn before deletion
+    return metadata.checker_status == CheckerStatus.CHECKED.value or metadata.reviewer_status == ReviewerStatus.APPROVED.value
+
+@app.post("/reports/batch/delete")
+async def batch_delete_reports(
+    batch: BatchDelete,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    codes = batch_codes(batch.report_codes)
+    if current_user["role"] != "district_user":
+        raise HTTPException(status_code=403, detail="You can only delete your own reports")
+
+    found = await load_batch(db, codes)
+    results, doomed = [], []
+    for code in codes:
+        if code not in found:
+            results.append(batch_result(code, 404, "Report not found"))
+            continue
+        metadata, report_data, _ = found[code]
+        if metadata.prepared_by != current_user["username"]:
+            results.append(batch_result(code, 403, "You can only delete your own reports"))
+        elif is_locked(metadata):
+            results.append(batch_result(code, 409, LOCKED_REPORT_DETAIL))
+        else:
+            doomed.append((metadata, report_data))
+            results.append(batch_result(code, 200, "Report deleted"))
+
+    if doomed:
+        report_ids = [report_data.id for _, report_data in doomed]
+        for table in FACT_TABLES.values():
+            await db.execute(delete(table).where(table.c.report_data_id.in_(report_ids)))
+        await db.execute(delete(ReportMetadata).where(ReportMetadata.id.in_([metadata.id for metadata, _ in doomed])))
+        await db.execute(delete(ReportData).where(ReportData.id.in_(report_ids)))
+        await release_blobs(db, [report_data.file_sha256 for _, report_data in doomed])
+        await db.commit()
+        response_cache.invalidate("reports")
+    return {"deleted": len(doomed), "results": results}
+
 @app.put("/reports/{report_code}")
 async def update_report(
     report_code: str,
     report_update: ReportUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    metadata = db.query(ReportMetadata).filter(ReportMetadata.report_code == report_code).first()
+    metadata = await get_report_metadata(report_code, db)
     if not metadata:
         raise HTTPException(status_code=404, detail="Report not found")
     if metadata.prepared_by != current_user["username"] or current_user["role"] != "district_user":
@@ -345,25 +1049,33 @@ async def update_report(
         metadata.title = report_update.title
     if report_update.description:
         metadata.description = report_update.description
-    db.commit()
+    await db.commit()
+    response_cache.invalidate("reports")
     return {"message": f"Report '{report_code}' updated successfully"}
 
 @app.delete("/reports/{report_code}")
 async def delete_report(
     report_code: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    metadata = db.query(ReportMetadata).filter(ReportMetadata.report_code == report_code).first()
+    """Delete one of your own reports. Checked or approved reports are refused with 409; withdraw them first."""
+    metadata = await get_report_metadata(report_code, db)
     if not metadata:
         raise HTTPException(status_code=404, detail="Report not found")
     if metadata.prepared_by != current_user["username"] or current_user["role"] != "district_user":
         raise HTTPException(status_code=403, detail="You can only delete your own reports")
+    if is_locked(metadata):
+        raise HTTPException(status_code=409, detail=LOCKED_REPORT_DETAIL)
     
-    report_data = db.query(ReportData).filter(ReportData.report_code == report_code).first()
-    db.delete(report_data)
-    db.delete(metadata)
-    db.commit()
+    report_data = await get_report_data(report_code, db)
+    await delete_facts(db, report_data)
+    await db.delete(metadata)
+    await db.delete(report_data)
+    await db.flush()
+    await release_blobs(db, [report_data.file_sha256])
+    await db.commit()
+    response_cache.invalidate("reports")
     return {"message": f"Report '{report_code}' deleted successfully"}
 
 @app.post("/reports/{report_code}/status")
@@ -371,16 +1083,17 @@ async def update_status(
     report_code: str,
     status_update: StatusUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    metadata = db.query(ReportMetadata).filter(ReportMetadata.report_code == report_code).first()
+    metadata = await get_report_metadata(report_code, db)
     if not metadata:
         raise HTTPException(status_code=404, detail="Report not found")
     
+    merge_changes = []
     if status_update.checker_status:
         if current_user["role"] != "district_manager":
             raise HTTPException(status_code=403, detail="Only district managers can update checker status")
-        prepared_by_user = get_user(metadata.prepared_by, db)
+        prepared_by_user = await get_user(metadata.prepared_by, db)
         if prepared_by_user.district != current_user["district"]:
             raise HTTPException(status_code=403, detail="You can only update reports from your district")
         metadata.checker_status = status_update.checker_status.value
@@ -389,68 +1102,259 @@ async def update_status(
     if status_update.reviewer_status:
         if current_user["role"] != "main_office":
             raise HTTPException(status_code=403, detail="Only main office can update reviewer status")
+        was_approved = metadata.reviewer_status == ReviewerStatus.APPROVED.value
         metadata.reviewer_status = status_update.reviewer_status.value
         metadata.reviewer_comment = status_update.comment if status_update.reviewer_status == ReviewerStatus.REJECTED else None
+        is_approved = status_update.reviewer_status == ReviewerStatus.APPROVED
+        report_data = await db.get(ReportData, metadata.report_data_id)
+        # was_approved may be stale by the time this commits, so the merge follows every reviewer decision
+        merge_changes.append(report_data)
+        if is_approved != was_approved:
+            await db.flush()
+            await refresh_rollups(db, await rollup_keys(db, [report_data]))
     
-    db.commit()
+    await db.commit()
+    await sync_merged(db, merge_changes)
+    response_cache.invalidate("reports", "merged")
     return {"message": f"Status for report '{report_code}' updated"}
 
 @app.get("/reports/")
-async def list_reports(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(ReportMetadata).join(ReportData, ReportMetadata.report_data_id == ReportData.id)
+async def list_reports(request: Request, filters: ReportFilter = Depends(), current_user: dict = Depends(get_current_user),
+                       db: AsyncSession = Depends(get_db)):
+    return await cached_json(request, current_user, ["reports"], lambda: query_reports(filters, current_user, db))
+
+REPORT_LIST_COLUMNS = ["report_code", "title", "description", "prepared_by", "district", "report_type", "created_date",
+                      "checker_status", "reviewer_status", "checker_comment", "reviewer_comment"]
+
+async def query_reports(filters: ReportFilter, current_user: dict, db: AsyncSession):
+    # Plain columns instead of ORM entities: rows go straight to dicts without building objects
+    query = select(*[ReportMetadata.__table__.c[name] for name in REPORT_LIST_COLUMNS], ReportData.category,
+                   ReportMetadata.id).join(ReportData, ReportMetadata.report_data_id == ReportData.id)
     if current_user["role"] in ["district_user", "district_manager"]:
-        reports = query.filter(ReportData.district == current_user["district"]).all()
-    else:  # main_office
-        reports = query.all()
-    return [{"report_code": r.report_code, "title": r.title, "description": r.description, "prepared_by": r.prepared_by,
-             "created_date": r.created_date, "checker_status": r.checker_status, "reviewer_status": r.reviewer_status,
-             "checker_comment": r.checker_comment, "reviewer_comment": r.reviewer_comment} for r in reports]
+        query = query.where(ReportMetadata.district == current_user["district"])
+    elif filters.district:  # main_office
+        query = query.where(ReportMetadata.district == filters.district.value)
+    if filters.category:
+        query = query.where(ReportData.category == filters.category.value)
+    if filters.report_type:
+        query = query.where(ReportMetadata.report_type == filters.report_type.value)
+    if filters.checker_status:
+        query = query.where(ReportMetadata.checker_status == filters.checker_status.value)
+    if filters.reviewer_status:
+        query = query.where(ReportMetadata.reviewer_status == filters.reviewer_status.value)
+    if filters.date_from:
+        query = query.where(ReportMetadata.created_date >= filters.date_from)
+    if filters.date_to:
+        query = query.where(ReportMetadata.created_date <= filters.date_to)
+    if filters.cursor:
+        # Keyset pagination: continue strictly after the last (created_date, id) already returned
+        cursor_date, cursor_id = decode_cursor(filters.cursor)
+        query = query.where(or_(ReportMetadata.created_date < cursor_date,
+                                 and_(ReportMetadata.created_date == cursor_date, ReportMetadata.id < cursor_id)))
+    query = query.order_by(ReportMetadata.created_date.desc(), ReportMetadata.id.desc()).limit(filters.limit + 1)
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > filters.limit:
+        rows = rows[:filters.limit]
+        next_cursor = encode_cursor(rows[-1].created_date, rows[-1].id)
+    items = [row._asdict() for row in rows]
+    for item in items:
+        del item["id"]
+    return {"items": items, "next_cursor": next_cursor}
 
 @app.get("/reports/merged/")
-async def merged_reports(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+async def merged_reports(request: Request, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if current_user["role"] != "main_office":
         raise HTTPException(status_code=403, detail="Only main office can view merged reports")
+
+    async def build():
+        report_types = (await db.execute(select(MergedReport.report_type))).scalars().all()
+
+        def read_all():
+            return encode_json({rtype: frame_records(merged_store.read_merged(rtype)) for rtype in report_types})
+        return await run_in_threadpool(read_all)
+    return await cached_json(request, current_user, ["merged"], build)
+
+@app.get("/reports/merged/{report_type:path}/export")
+async def export_merged_report(
+    report_type: str,
+    request: Request,
+    export_format: ExportFormat = Query(ExportFormat.XLSX, alias="format"),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if current_user["role"] != "main_office":
+        raise HTTPException(status_code=403, detail="Only main office can export merged reports")
+    approved = (await db.execute(
+        select(ReportData.report_code, ReportData.file_sha256)
+        .join(ReportMetadata, ReportMetadata.report_data_id == ReportData.id)
+        .where(ReportData.report_type == report_type, ReportMetadata.reviewer_status == ReviewerStatus.APPROVED.value)
+    )).all()
+    if not approved or not merged_store.has_reports(report_type):
+        raise HTTPException(status_code=404, detail=f"No approved reports for {report_type}")
+
+    fmt = export_format.value
+    version = exports.approval_version(approved)
+    filename = f"{safe_filename(report_type)}_merged.{fmt}"
+    media_type = exports.EXPORT_MEDIA_TYPES[fmt]
+    try:
+        return file_download_response(request, exports.export_path(report_type, version, fmt), f"{version}-{fmt}",
+                                      filename, media_type)
+    except FileNotFoundError:
+        pass  # first download of this approval set, or its file was just dropped as superseded
+    return StreamingResponse(exports.stream_export(report_type, version, fmt, [code for code, _ in approved]),
+                             media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/analytics/")
+async def analytics_catalog(current_user: dict = Depends(get_current_user)):
+    return {
+        "templates": {name: list(measure_columns(spec)) for name, spec in TEMPLATE_SPECS.items()},
+        "dimensions": [d.value for d in AnalyticsDimension],
+        "functions": [f.value for f in AnalyticsFunction],
+    }
+
+@app.get("/analytics/{template}")
+async def analytics(
+    template: str,
+    measure: str,
+    group_by: List[AnalyticsDimension] = Query([AnalyticsDimension.DISTRICT]),
+    agg: List[AnalyticsFunction] = Query([AnalyticsFunction.SUM]),
+    district: Optional[District] = None,
+    month_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    month_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    approved_only: bool = True,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    spec = TEMPLATE_SPECS.get(template)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown template '{template}'")
+    measures = measure_columns(spec)
+    if measure not in measures:
+        raise HTTPException(status_code=400, detail=f"Measure must be one of: {', '.join(measures)}")
+    if current_user["role"] != "main_office":
+        district_filter = current_user["district"]
+    else:
+        district_filter = district.value if district else None
+    dimensions = [d.value for d in dict.fromkeys(group_by)]
+    functions = [f.value for f in dict.fromkeys(agg)]
+    if approved_only:
+        query = rollups.analytics_query(ROLLUP_TABLE, template, measure, dimensions, functions,
+                                        district_filter, month_from, month_to)
+    else:
+        # The rollups hold approved rows only; anything wider scans the fact table
+        query = aggregate_query(FACT_TABLES[template], ReportData.__table__, measure, measures[measure], dimensions,
+                                functions, async_engine.dialect.name, district_filter, month_from, month_to)
+    return [dict(row._mapping) for row in (await db.execute(query)).all()]
+
+@app.post("/reports/export.zip")
+async def export_reports_zip(export: ReportExport, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    report_codes = list(dict.fromkeys(export.report_codes))
+    if not report_codes:
+        raise HTTPException(status_code=400, detail="No report codes given")
+    
+    reports = (await db.execute(select(ReportData.report_code, ReportData.district, ReportData.file_sha256).where(
+        ReportData.report_code.in_(report_codes)))).all()
+    found = {r.report_code: r for r in reports}
+    missing = [code for code in report_codes if code not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Reports not found: {', '.join(missing)}")
     
-    data = db.query(ReportData).join(ReportMetadata).filter(ReportMetadata.reviewer_status == ReviewerStatus.APPROVED.value).all()
-    merged = {}
-    for d in data:
-        report_type = d.report_type
-        if report_type not in merged:
-            merged[report_type] = []
-        df = pd.read_json(d.data_json, orient="records")
-        merged[report_type].append(df)
+    if current_user["role"] in ["district_user", "district_manager"]:
+        foreign = [r.report_code for r in reports if r.district != current_user["district"]]
+        if foreign:
+            raise HTTPException(status_code=403, detail="You can only download reports from your district")
+    
+    not_migrated = [code for code in report_codes if not found[code].file_sha256]
+    if not_migrated:
+        raise HTTPException(status_code=409, detail=f"Reports awaiting blob migration: {', '.join(not_migrated)}")
     
-    result = {rtype: pd.concat(dfs, ignore_index=True).to_dict(orient="records") for rtype, dfs in merged.items()}
-    return result
+    entries, names = [], set()
+    for code in report_codes:
+        # Report codes are free text; never let one become a path inside the archive
+        name = safe_filename(code)
+        while f"{name}.xlsx" in names:
+            name += "_"
+        names.add(f"{name}.xlsx")
+        entries.append((f"{name}.xlsx", blob_store.path(found[code].file_sha256)))
+    return StreamingResponse(iter_zip(entries), media_type="application/zip",
+                             headers={"Content-Disposition": 'attachment; filename="selected_reports.zip"'})
 
 @app.get("/reports/{report_code}/download")
-async def download_report(report_code: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    report = db.query(ReportData).filter(ReportData.report_code == report_code).first()
+async def download_report(report_code: str, request: Request, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    report = await get_report_data(report_code, db)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
     
     if current_user["role"] in ["district_user", "district_manager"] and report.district != current_user["district"]:
         raise HTTPException(status_code=403, detail="You can only download reports from your district")
     
-    file_content = bytes.fromhex(report.file_content)
-    return {"file_content": file_content.hex(), "filename": f"{report_code}.xlsx"}
+    filename = f"{safe_filename(report_code)}.xlsx"
+    if report.file_sha256:
+        return file_download_response(request, blob_store.path(report.file_sha256), report.file_sha256, filename)
+    # Rows not yet moved by migrate_blobs.py still carry the workbook as hex text
+    return Response(content=bytes.fromhex(report.file_content), media_type=XLSX_MEDIA_TYPE,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/reports/{report_code:path}/rows")
+async def report_rows(
+    report_code: str,
+    columns: List[str] = Query([]),
+    filter: List[str] = Query([], description='Conditions such as "Date>=2024-01-01"; all must hold'),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    report = (await db.execute(select(ReportData.district, ReportData.file_sha256).where(
+        ReportData.report_code == report_code))).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    if current_user["role"] in ["district_user", "district_manager"] and report.district != current_user["district"]:
+        raise HTTPException(status_code=403, detail="You can only view reports from your district")
+    if not columnar.has_frame(report.file_sha256):
+        raise HTTPException(status_code=409, detail="Report has no parsed data yet")
+
+    def read_page():
+        schema = columnar.frame_schema(report.file_sha256)
+        unknown = [column for column in columns if column not in schema.names]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        row_filter = columnar.row_filter(schema, filter)
+        return columnar.scan_frame(report.file_sha256, columns or None, row_filter, offset, limit)
+
+    try:
+        table, total = await run_in_threadpool(read_page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    next_offset = offset + table.num_rows
+    return {
+        "columns": table.column_names,
+        "rows": frame_records(table.to_pandas()),
+        "offset": offset,
+        "total": total,
+        "next_offset": next_offset if next_offset < total else None,
+    }
 
 @app.get("/users/", response_model=List[UserResponse])
-async def list_users(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+async def list_users(request: Request, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if current_user["role"] != "main_office":
         raise HTTPException(status_code=403, detail="Only main office can list users")
-    users = db.query(User).all()
-    return users
+
+    async def build():
+        return [user_profile(user) for user in (await db.execute(select(User))).scalars().all()]
+    return await cached_json(request, current_user, ["users"], build)
 
 @app.post("/users/", response_model=UserResponse)
-async def add_user(user: UserCreate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+async def add_user(user: UserCreate, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if current_user["role"] != "main_office":
         raise HTTPException(status_code=403, detail="Only main office can add users")
     
-    if db.query(User).filter(User.username == user.username).first():
+    if await get_user(user.username, db):
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await hash_password(user.password)
     db_user = User(
         username=user.username,
         hashed_password=hashed_password,
@@ -461,10 +1365,119 @@ async def add_user(user: UserCreate, current_user: dict = Depends(get_current_us
         district=user.district.value if user.district else None
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_user(db_user.username)
+    response_cache.invalidate("users")
     return db_user
 
+# Background ingestion: jobs are rows in ingest_jobs, workers are asyncio tasks
+# that claim queued rows, so a restart picks up where it left off
+ingest_wakeup = asyncio.Event()
+ingest_tasks = []
+
+async def enqueue_ingest(db: AsyncSession, report: ReportUpload, path: str, file_sha256: str, district, prepared_by: str,
+                         duplicates: DuplicatePolicy = DuplicatePolicy.REJECT):
+    pending = (await db.execute(select(IngestJob.id, IngestJob.report_code).where(
+        IngestJob.file_sha256 == file_sha256,
+        IngestJob.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value])).limit(1))).first()
+    if pending and duplicates == DuplicatePolicy.REJECT:
+        raise HTTPException(status_code=409, detail={
+            "message": f"This workbook is already being processed as '{pending.report_code}'",
+            "report_code": pending.report_code, "job_id": pending.id,
+        })
+    job_id = uuid.uuid4().hex
+    now = datetime.now()
+    job = IngestJob(id=job_id, status=JobStatus.QUEUED.value, stage="queued", report_type=report.report_type.value,
+                    report_code=report.report_code, category=report.category.value, title=report.title,
+                    description=report.description, district=district, prepared_by=prepared_by, spool_path=path, file_sha256=file_sha256,
+                    created_at=now, updated_at=now)
+    db.add(job)
+    await db.commit()
+    ingest_wakeup.set()
+    return job
+
+async def set_job_state(db: AsyncSession, job: IngestJob, **fields):
+    for key, value in fields.items():
+        setattr(job, key, value)
+    job.updated_at = datetime.now()
+    await db.commit()
+
+async def claim_ingest_job(db: AsyncSession):
+    queued = select(IngestJob.id).where(IngestJob.status == JobStatus.QUEUED.value).order_by(IngestJob.created_at).limit(1)
+    job_id = (await db.execute(queued)).scalar()
+    if job_id is None:
+        return None
+    # Only one worker wins the status flip from queued to running
+    claimed = await db.execute(update(IngestJob).where(IngestJob.id == job_id, IngestJob.status == JobStatus.QUEUED.value)
+                               .values(status=JobStatus.RUNNING.value, stage="parsing", updated_at=datetime.now()))
+    await db.commit()
+    if claimed.rowcount != 1:
+        return await claim_ingest_job(db)
+    return await db.get(IngestJob, job_id)
+
+async def process_ingest_job(db: AsyncSession, job: IngestJob):
+    report = ReportUpload(report_type=job.report_type, report_code=job.report_code, title=job.title,
+                          description=job.description, category=job.category)
+    spooled_path = job.spool_path
+    try:
+        if await get_report_data(job.report_code, db):
+            raise UploadRejected(400, "Report code already exists")
+        # An identical workbook may have been stored while this job was queued
+        duplicate = await find_duplicate(db, job.file_sha256)
+        if duplicate and (not job.district or duplicate.district == job.district) and \
+                can_link(duplicate, job.report_type, job.file_sha256):
+            district = duplicate.district
+        else:
+            district = (await ingest_spooled(spooled_path, job.file_sha256, job.report_type, job.district))["district"]
+        await set_job_state(db, job, stage="storing")
+        await store_report(db, report, job.prepared_by, job.file_sha256, district)
+        await set_job_state(db, job, status=JobStatus.SUCCEEDED.value, stage="done")
+    except PoolSaturated:
+        await set_job_state(db, job, status=JobStatus.QUEUED.value, stage="queued")
+        await asyncio.sleep(INGEST_POLL_SECONDS)
+        return
+    except Exception as e:
+        await db.rollback()
+        detail = e.detail if isinstance(e, (UploadRejected, HTTPException)) else f"Unexpected error: {e}"
+        await set_job_state(db, job, status=JobStatus.FAILED.value, error=detail if isinstance(detail, str) else json.dumps(detail))
+    await run_in_threadpool(discard_spool, spooled_path)
+
+async def ingest_worker():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await claim_ingest_job(db)
+                if job:
+                    await process_ingest_job(db, job)
+                    continue
+        except Exception:
+            # Keep the worker alive through transient database errors
+            await asyncio.sleep(INGEST_POLL_SECONDS)
+            continue
+        ingest_wakeup.clear()
+        try:
+            await asyncio.wait_for(ingest_wakeup.wait(), timeout=INGEST_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+@app.on_event("startup")
+async def start_ingest_workers():
+    async with AsyncSessionLocal() as db:
+        # Jobs left running by a previous process never finished; run them again
+        await db.execute(update(IngestJob).where(IngestJob.status == JobStatus.RUNNING.value)
+                         .values(status=JobStatus.QUEUED.value, stage="queued"))
+        await db.commit()
+    for _ in range(INGEST_WORKERS):
+        ingest_tasks.append(asyncio.create_task(ingest_worker()))
+
+@app.on_event("shutdown")
+async def stop_ingest_workers():
+    for task in ingest_tasks:
+        task.cancel()
+    await asyncio.gather(*ingest_tasks, return_exceptions=True)
+    ingest_tasks.clear()
+
 def bootstrap_users(db: Session):
     if not db.query(User).first():
         initial_users = [
@@ -487,7 +1500,35 @@ def bootstrap_users(db: Session):
             db.add(db_user)
         db.commit()
 
+def bootstrap_merged(db: Session):
+    # Reconcile the partitions with the committed approvals: builds the merge for databases
+    # that predate it and repairs one left behind by a crash between a commit and its file changes
+    approved = db.query(ReportData).join(ReportMetadata).filter(ReportMetadata.reviewer_status == ReviewerStatus.APPROVED.value).all()
+    by_type = {}
+    for d in approved:
+        by_type.setdefault(d.report_type, {})[d.report_code] = d
+    known_types = set(db.execute(select(MergedReport.report_type)).scalars())
+    for report_type in known_types | set(by_type):
+        wanted = by_type.get(report_type, {})
+        present = merged_store.report_codes(report_type)
+        frames = [(code, load_report_frame(d)) for code, d in wanted.items() if code not in present]
+        refresh_merged(db, report_type, merged_store.update_reports(report_type, frames, present - set(wanted)))
+    db.commit()
+
+def bootstrap_rollups(db: Session):
+    # Build the rollups once for databases whose approvals predate them
+    if db.execute(select(ROLLUP_TABLE.c.id).limit(1)).first():
+        return
+    for template, spec in TEMPLATE_SPECS.items():
+        for statement in rollups.refresh_statements(ROLLUP_TABLE, FACT_TABLES[template], template, spec,
+                                                    ReportData.__table__, ReportMetadata.__table__,
+                                                    ReviewerStatus.APPROVED.value, engine.dialect.name):
+            db.execute(statement)
+    db.commit()
+
 with SessionLocal() as db:
     bootstrap_users(db)
+    bootstrap_merged(db)
+    bootstrap_rollups(db)
 
 # Run with: uvicorn main:app --reload
\ No newline at end of file
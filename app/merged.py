@@ -0,0 +1,157 @@
+# merged.py
+# Materialized merge of approved reports: one directory per report_type with
+# one Parquet partition per report. Approving or withdrawing a report writes
+# or removes its own partition only, with an atomic replace, so the cost does
+# not grow with the history and several server processes can apply changes
+# side by side. Rows carry a hidden report code column; exports use it to
+# check which reports a merge was read from.
+import base64
+import hashlib
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from columnar import to_table
+from storage import UPLOAD_DIR, atomic_write
+
+MERGED_DIR = os.path.join(UPLOAD_DIR, "merged")
+REPORT_CODE_COLUMN = "_report_code"
+PARTITION_SUFFIX = ".parquet"
+
+
+def report_type_dir(root: str, report_type: str) -> str:
+    # Report type names contain spaces, tabs and slashes, so name the directory by hash
+    return os.path.join(root, hashlib.sha1(report_type.encode()).hexdigest())
+
+
+def merged_dir(report_type: str) -> str:
+    return report_type_dir(MERGED_DIR, report_type)
+
+
+def _partition_name(report_code: str) -> str:
+    # Report codes are free text; urlsafe base64 keeps them reversible and path-safe
+    return base64.urlsafe_b64encode(report_code.encode()).decode().rstrip("=") + PARTITION_SUFFIX
+
+
+def _partition_code(name: str) -> str:
+    encoded = name[:-len(PARTITION_SUFFIX)]
+    return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+
+
+def partition_paths(report_type: str):
+    """Partition files of report_type, oldest first, so reads keep the approval order."""
+    directory = merged_dir(report_type)
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(PARTITION_SUFFIX)]
+    return sorted(paths, key=lambda path: (os.stat(path).st_mtime_ns, path))
+
+
+def report_codes(report_type: str):
+    return {_partition_code(os.path.basename(path)) for path in partition_paths(report_type)}
+
+
+def has_reports(report_type: str) -> bool:
+    return bool(partition_paths(report_type))
+
+
+def _existing(paths, read):
+    # A partition listed a moment ago can be gone by now: its report was withdrawn meanwhile
+    for path in paths:
+        try:
+            yield read(path)
+        except FileNotFoundError:
+            continue
+
+
+def row_count(report_type: str) -> int:
+    # Footers only; no data pages are read
+    return sum(metadata.num_rows for metadata in _existing(partition_paths(report_type), pq.read_metadata))
+
+
+def _write_partition(report_type: str, report_code: str, df: pd.DataFrame):
+    with atomic_write(os.path.join(merged_dir(report_type), _partition_name(report_code))) as tmp_path:
+        pq.write_table(to_table(df.assign(**{REPORT_CODE_COLUMN: report_code}).reset_index(drop=True)), tmp_path)
+
+
+def _remove_partition(report_type: str, report_code: str):
+    path = os.path.join(merged_dir(report_type), _partition_name(report_code))
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def update_reports(report_type: str, added=(), removed=()) -> int:
+    """Write a partition for each (report_code, DataFrame) pair and drop the removed codes.
+
+    Re-adding a code replaces its rows; removing a missing code is a no-op. Returns the new row count.
+    """
+    for report_code in removed:
+        _remove_partition(report_type, report_code)
+    for report_code, df in added:
+        _write_partition(report_type, report_code, df)
+    return row_count(report_type)
+
+
+def merged_schema(report_type: str, paths=None) -> pa.Schema:
+    """One schema covering every partition; columns whose types disagree across reports become strings."""
+    schemas = [schema.remove_metadata() for schema in _existing(paths or partition_paths(report_type), pq.read_schema)]
+    if not schemas:
+        return pa.schema([])
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    by_name = {}
+    for schema in schemas:
+        for field in schema:
+            by_name.setdefault(field.name, []).append(pa.schema([field]))
+    fields = []
+    for name, single in by_name.items():
+        try:
+            fields.append(pa.unify_schemas(single, promote_options="permissive").field(0))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table.column(field.name)
+        columns.append(column if column.type == field.type else pc.cast(column, field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def iter_batches(report_type: str, batch_size: int, columns=None):
+    """(schema, generator of record batches) over every partition, conformed to one schema."""
+    paths = partition_paths(report_type)
+    schema = merged_schema(report_type, paths)
+    if columns:
+        schema = pa.schema([schema.field(name) for name in columns if name in schema.names])
+
+    def batches():
+        for source in _existing(paths, lambda path: pq.ParquetFile(path, memory_map=True)):
+            for batch in source.iter_batches(batch_size=batch_size):
+                table = _conform(pa.Table.from_batches([batch]), schema)
+                yield from table.to_batches()
+    return schema, batches()
+
+
+def read_merged(report_type: str, columns=None) -> pd.DataFrame:
+    paths = partition_paths(report_type)
+    if not paths:
+        return pd.DataFrame(columns=columns or [])
+    schema = merged_schema(report_type, paths)
+    if columns:
+        schema = pa.schema([schema.field(name) for name in columns if name in schema.names])
+    tables = [_conform(table, schema) for table in _existing(paths, lambda path: pq.read_table(path, memory_map=True))]
+    table = pa.concat_tables(tables) if tables else schema.empty_table()
+    if REPORT_CODE_COLUMN in table.column_names:
+        table = table.drop([REPORT_CODE_COLUMN])
+    return table.to_pandas()
@@ -0,0 +1,44 @@
+# migrate_blobs.py
+# One-shot migration: move hex-encoded workbooks out of report_data.file_content
+# into the content-addressed blob store under uploads/blobs.
+from sqlalchemy import create_engine, text
+
+from migrations import run_migrations
+from storage import blob_store
+
+DATABASE_URL = "sqlite:///reports.db"
+
+
+def migrate_blobs(engine):
+    run_migrations(engine)
+    migrated = 0
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id FROM report_data WHERE file_content IS NOT NULL AND file_content != ''"
+        )).fetchall()
+    for (row_id,) in rows:
+        # One row per transaction so a large table is never held in memory at once
+        with engine.begin() as conn:
+            hex_content = conn.execute(
+                text("SELECT file_content FROM report_data WHERE id = :id"), {"id": row_id}
+            ).scalar()
+            sha256 = blob_store.put_bytes(bytes.fromhex(hex_content))
+            conn.execute(
+                text("UPDATE report_data SET file_sha256 = :sha, file_content = NULL WHERE id = :id"),
+                {"sha": sha256, "id": row_id},
+            )
+        migrated += 1
+    if migrated and engine.dialect.name == "sqlite":
+        # Give the space held by the hex text back to the filesystem
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+    return migrated
+
+
+if __name__ == "__main__":
+    engine = create_engine(DATABASE_URL)
+    try:
+        count = migrate_blobs(engine)
+        print(f"Moved {count} report file(s) into {blob_store.root}")
+    except Exception as e:
+        print(f"Error during migration: {e}")
@@ -0,0 +1,66 @@
+# migrate_columnar.py
+# One-shot backfill: write the Parquet frame for every report that still only
+# has data_json, then drop the JSON copy. Run migrate_blobs.py first.
+from io import BytesIO, StringIO
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+import columnar
+from migrations import backfill_facts
+from storage import blob_store
+
+DATABASE_URL = "sqlite:///reports.db"
+
+
+def backfill_frames(engine):
+    backfilled = 0
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, file_sha256 FROM report_data WHERE data_json IS NOT NULL"
+        )).fetchall()
+    for row_id, sha256 in rows:
+        with engine.begin() as conn:
+            df = None
+            if sha256 and blob_store.exists(sha256):
+                # Re-parse the original workbook so dtypes (e.g. Date) come back exactly
+                try:
+                    df = pd.read_excel(BytesIO(blob_store.read_bytes(sha256)))
+                except Exception:
+                    df = None  # older uploads stored a truncated stream; use the JSON copy instead
+            if df is None:
+                data_json = conn.execute(
+                    text("SELECT data_json FROM report_data WHERE id = :id"), {"id": row_id}
+                ).scalar()
+                df = pd.read_json(StringIO(data_json), orient="records")
+                if "Date" in df.columns:
+                    df["Date"] = pd.to_datetime(df["Date"], unit="ms")
+                # No usable original workbook: rebuild one from the frame so the
+                # blob, its Parquet sidecar and downloads all agree
+                workbook = BytesIO()
+                df.to_excel(workbook, index=False)
+                stale_sha256, sha256 = sha256, blob_store.put_bytes(workbook.getvalue())
+                conn.execute(text("UPDATE report_data SET file_sha256 = :sha WHERE id = :id"),
+                             {"sha": sha256, "id": row_id})
+                if stale_sha256 and not conn.execute(
+                    text("SELECT 1 FROM report_data WHERE file_sha256 = :sha AND id != :id"),
+                    {"sha": stale_sha256, "id": row_id},
+                ).first():
+                    blob_store.delete(stale_sha256)
+            columnar.write_frame(sha256, df)
+            conn.execute(text("UPDATE report_data SET data_json = NULL WHERE id = :id"), {"id": row_id})
+        backfilled += 1
+    if backfilled:
+        # Frames written here were missing when the fact table migration ran
+        with engine.begin() as conn:
+            backfill_facts(conn)
+    return backfilled
+
+
+if __name__ == "__main__":
+    engine = create_engine(DATABASE_URL)
+    try:
+        count = backfill_frames(engine)
+        print(f"Backfilled {count} report frame(s) to Parquet")
+    except Exception as e:
+        print(f"Error during backfill: {e}")
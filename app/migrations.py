@@ -0,0 +1,115 @@
+# migrations.py
+# Versioned schema migrations for reports.db and Postgres deployments.
+# create_all() only creates missing tables, so every column or index added
+# to an existing table gets a numbered step here. Steps must be idempotent:
+# on a fresh database create_all() has already built the final schema and
+# the steps only record themselves as applied.
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, create_engine, inspect, text
+
+import columnar
+from facts import build_fact_tables, iter_fact_batches
+from validation import template_for
+
+DATABASE_URL = "sqlite:///reports.db"
+
+
+def _columns(conn, table):
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table, column, ddl):
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_index(conn, name, table, columns):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+def add_file_sha256(conn):
+    _add_column(conn, "report_data", "file_sha256", "VARCHAR(64)")
+
+
+def add_report_indexes(conn):
+    _create_index(conn, "ix_report_metadata_report_code", "report_metadata", ["report_code"])
+    _create_index(conn, "ix_report_metadata_report_data_id", "report_metadata", ["report_data_id"])
+    _create_index(conn, "ix_report_metadata_reviewer_status", "report_metadata", ["reviewer_status"])
+    _create_index(conn, "ix_report_data_district", "report_data", ["district"])
+    _create_index(conn, "ix_report_data_file_sha256", "report_data", ["file_sha256"])
+
+
+def add_metadata_district(conn):
+    # district lives on report_data but listing sorts on report_metadata.created_date;
+    # copying it next to created_date lets one composite index serve the listing
+    _add_column(conn, "report_metadata", "district", "VARCHAR")
+    conn.execute(text(
+        "UPDATE report_metadata SET district = "
+        "(SELECT district FROM report_data WHERE report_data.id = report_metadata.report_data_id) "
+        "WHERE district IS NULL"
+    ))
+    _create_index(conn, "ix_report_metadata_district_created", "report_metadata", ["district", "created_date", "id"])
+    _create_index(conn, "ix_report_metadata_created", "report_metadata", ["created_date", "id"])
+
+
+def backfill_facts(conn):
+    # Fact tables are new; load every report uploaded before them. The standalone
+    # scripts run this without main.py's create_all, so make sure the tables exist
+    metadata = MetaData()
+    Table("report_data", metadata, autoload_with=conn)  # target of the facts' foreign key
+    tables = build_fact_tables(metadata)
+    metadata.create_all(conn, tables=list(tables.values()))
+    reports = conn.execute(text("SELECT id, report_code, report_type, file_sha256 FROM report_data")).fetchall()
+    for report_id, report_code, report_type, sha256 in reports:
+        spec = template_for(report_type)
+        if spec is None or not columnar.has_frame(sha256):
+            continue
+        table = tables[spec.name]
+        if conn.execute(text(f"SELECT 1 FROM {table.name} WHERE report_data_id = :id"), {"id": report_id}).first():
+            continue
+        for rows in iter_fact_batches(columnar.frame_path(sha256), spec, report_id, report_code):
+            conn.execute(table.insert(), rows)
+
+
+MIGRATIONS = [
+    (1, "report_data.file_sha256 for the blob store", add_file_sha256),
+    (2, "indexes on report lookup and join columns", add_report_indexes),
+    (3, "report_metadata.district with (district, created_date) index", add_metadata_district),
+    (4, "backfill report rows into the per-template fact tables", backfill_facts),
+]
+
+
+def applied_versions(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine):
+    """Apply every pending step in order, each in its own transaction. Returns the versions applied."""
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.now()},
+            )
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    engine = create_engine(DATABASE_URL)
+    applied = run_migrations(engine)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print("Schema is up to date")
@@ -2,15 +2,16 @@
 import streamlit as st
 import requests
 import pandas as pd
-from io import BytesIO
-import zipfile
-
-API_URL = "http://127.0.0.1:8000"
+from urllib.parse import quote
+from api_client import APIError, api_request, get_catalog, get_json, invalidate_cache
 
 st.set_page_config(page_title="Main App", layout="wide")
 
 def logout():
+    if st.session_state.get("refresh_token"):
+        api_request("POST", "/token/revoke", json={"refresh_token": st.session_state.refresh_token})
     st.session_state.token = None
+    st.session_state.refresh_token = None
     st.session_state.username = None
     st.session_state.role = None
     st.session_state.district = None
@@ -18,19 +19,22 @@ def logout():
     st.success("Logged out successfully!")
     st.switch_page("app.py")
 
-def upload_file(category, report_type, report_code, title, description, file):
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
+def upload_file(category, report_type, report_code, title, description, file, link_duplicate=False):
     files = {"file": (file.name, file, "multipart/form-data")}
-    params = {"category": category, "report_type": report_type, "report_code": report_code, "title": title, "description": description}
+    params = {"category": category, "report_type": report_type, "report_code": report_code, "title": title, "description": description,
+              "duplicates": "link" if link_duplicate else "reject"}
     
     try:
-        response = requests.post(f"{API_URL}/upload/", headers=headers, files=files, params=params)
+        response = api_request("POST", "/upload/", files=files, params=params)
         if response.status_code == 200:
+            invalidate_cache()
             st.success(response.json()["message"])
             return True
         else:
             try:
                 error_detail = response.json().get("detail", "Unknown error")
+                if response.status_code == 409 and isinstance(error_detail, dict):
+                    error_detail = error_detail["message"]  # duplicate workbook: name the report it was uploaded as
                 st.error(f"Upload failed: {error_detail}")
             except requests.exceptions.JSONDecodeError:
                 st.error(f"Upload failed with non-JSON response: {response.text}")
@@ -40,93 +44,124 @@ def upload_file(category, report_type, report_code, title, description, file):
         return False
 
 def update_report(report_code, title, description):
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.put(f"{API_URL}/reports/{report_code}", headers=headers, json={"title": title, "description": description})
+    response = api_request("PUT", f"/reports/{report_code}", json={"title": title, "description": description})
     if response.status_code == 200:
+        invalidate_cache()
         st.success(response.json()["message"])
         st.rerun()
     else:
         st.error(response.json()["detail"])
 
-def delete_report(report_code):
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.delete(f"{API_URL}/reports/{report_code}", headers=headers)
-    if response.status_code == 200:
-        st.success(response.json()["message"])
-        st.rerun()
-    else:
+def report_batch(path, payload):
+    """POST a batch request and report the items the server refused. Returns True when all were applied."""
+    response = api_request("POST", path, json=payload)
+    if response.status_code != 200:
         st.error(response.json()["detail"])
+        return False
+    invalidate_cache()
+    failed = [r for r in response.json()["results"] if r["status"] != 200]
+    for result in failed:
+        st.warning(f"{result['report_code']}: {result['detail']}")
+    return not failed
 
-def delete_selected_reports(report_codes, reports_df):
-    deleted = []
-    skipped = []
-    for report_code in report_codes:
-        report = reports_df[reports_df["report_code"] == report_code].iloc[0]
-        checker_status = report["checker_status"]
-        reviewer_status = report["reviewer_status"]
-        if checker_status == "Checked" or reviewer_status == "Approved":
-            skipped.append(report_code)
-        else:
-            delete_report(report_code)
-            deleted.append(report_code)
-    if skipped:
-        st.warning(f"Skipped deletion of reports with 'Checked' or 'Approved' status: {', '.join(skipped)}")
-    if deleted:
-        st.success(f"Deleted reports: {', '.join(deleted)}")
+def delete_selected_reports(report_codes):
+    if report_batch("/reports/batch/delete", {"report_codes": report_codes}):
+        st.rerun()
 
 def download_report(report_code):
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.get(f"{API_URL}/reports/{report_code}/download", headers=headers)
+    response = api_request("GET", f"/reports/{report_code}/download")
     if response.status_code == 200:
-        data = response.json()
-        file_content = bytes.fromhex(data["file_content"])
-        return file_content, data["filename"]
+        return response.content, f"{report_code}.xlsx"
     else:
         st.error(response.json()["detail"])
         return None, None
 
-def update_status(report_code, checker_status=None, reviewer_status=None, comment=""):
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    data = {"checker_status": checker_status, "reviewer_status": reviewer_status, "comment": comment}
-    response = requests.post(f"{API_URL}/reports/{report_code}/status", headers=headers, json=data)
+def download_reports_zip(report_codes):
+    response = api_request("POST", "/reports/export.zip", json={"report_codes": report_codes})
     if response.status_code == 200:
-        st.success(response.json()["message"])
-        st.rerun()  # Refresh the page to reflect the updated status
+        return response.content
     else:
         st.error(response.json()["detail"])
+        return None
 
-def fetch_reports():
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.get(f"{API_URL}/reports/", headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        if not data:
-            return pd.DataFrame(columns=["select", "report_code", "title", "description", "prepared_by", "district", 
-                                         "created_date", "checker_status", "reviewer_status", "checker_comment", 
-                                         "reviewer_comment"])
-        df = pd.DataFrame(data)
-        df.insert(0, "select", False)  # Add selection checkbox column
-        return df
-    else:
-        st.error(f"Failed to fetch reports: {response.json().get('detail', response.text)}")
-        return pd.DataFrame(columns=["select", "report_code", "title", "description", "prepared_by", "district", 
-                                     "created_date", "checker_status", "reviewer_status", "checker_comment", 
-                                     "reviewer_comment"])
+def update_status(report_codes, checker_status=None, reviewer_status=None, comment=""):
+    data = {"report_codes": report_codes, "checker_status": checker_status, "reviewer_status": reviewer_status,
+            "comment": comment}
+    if report_batch("/reports/batch/status", data):
+        st.rerun()  # Refresh the page to reflect the updated status
 
-def fetch_merged_reports():
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.get(f"{API_URL}/reports/merged/", headers=headers)
+EXPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def export_merged_report(report_type, export_format):
+    # The server builds (or reuses) the file for the current approval set
+    response = api_request("GET", f"/reports/merged/{quote(report_type)}/export", params={"format": export_format})
     if response.status_code == 200:
-        return response.json()
+        return response.content
     else:
         st.error(response.json()["detail"])
         return None
 
+REPORT_COLUMNS = ["select", "report_code", "title", "description", "prepared_by", "district", "created_date",
+                  "checker_status", "reviewer_status", "checker_comment", "reviewer_comment"]
+PAGE_SIZE = 100
+
+def fetch_reports(cursor=None, filters=None):
+    params = {"limit": PAGE_SIZE, **(filters or {})}
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        data = get_json("/reports/", params)
+    except APIError as e:
+        st.error(f"Failed to fetch reports: {e.detail}")
+        return pd.DataFrame(columns=REPORT_COLUMNS), None
+    if not data["items"]:
+        return pd.DataFrame(columns=REPORT_COLUMNS), None
+    df = pd.DataFrame(data["items"])
+    df.insert(0, "select", False)  # Add selection checkbox column
+    return df, data["next_cursor"]
+
+ROWS_PAGE_SIZE = 500
+
+def fetch_report_rows(report_code, offset=0, filters=None):
+    try:
+        return get_json(f"/reports/{quote(report_code, safe='')}/rows",
+                        [("offset", offset), ("limit", ROWS_PAGE_SIZE)] + [("filter", f) for f in filters or []])
+    except APIError as e:
+        st.error(e.detail)
+        return None
+
+def show_report_rows(report_code):
+    with st.expander(f"Data of {report_code}", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        date_from = col1.date_input("Date from", value=None, key=f"rows_from_{report_code}")
+        date_to = col2.date_input("Date to", value=None, key=f"rows_to_{report_code}")
+        filters = ([f"Date>={date_from.isoformat()}"] if date_from else []) + \
+                  ([f"Date<={date_to.isoformat()}T23:59:59"] if date_to else [])
+        page = col3.number_input("Page", min_value=1, value=1, step=1, key=f"rows_page_{report_code}")
+        data = fetch_report_rows(report_code, (page - 1) * ROWS_PAGE_SIZE, filters)
+        if data:
+            st.dataframe(pd.DataFrame(data["rows"], columns=data["columns"]), use_container_width=True, hide_index=True)
+            pages = max(1, -(-data["total"] // ROWS_PAGE_SIZE))
+            st.caption(f"Page {page} of {pages} ({data['total']} rows)")
+
+def fetch_merged_reports():
+    try:
+        return get_json("/reports/merged/")
+    except APIError as e:
+        st.error(e.detail)
+        return None
+
 # Initialize session state
 if "show_upload_form" not in st.session_state:
     st.session_state.show_upload_form = False
 if "edit_report_code" not in st.session_state:
     st.session_state.edit_report_code = None
+if "report_cursors" not in st.session_state:
+    st.session_state.report_cursors = [None]  # cursor of every page visited so far
 
 st.title("District Data Management")
 
@@ -137,13 +172,37 @@ else:
     st.sidebar.title("Navigation")
     page = st.sidebar.radio("Go to", ["Reports", "Users"]) if st.session_state.role == "main_office" else "Reports"
     
+    catalog = get_catalog()
     st.subheader(f"Welcome, {st.session_state.username} ({st.session_state.role})")
     if st.button("Logout"):
         logout()
 
     if page == "Reports":
         st.subheader("Your Reports")
-        reports_df = fetch_reports()
+        with st.expander("Filters"):
+            filter_cols = st.columns(4)
+            report_filters = {
+                "checker_status": filter_cols[0].selectbox("Checker Status", catalog["checker_statuses"], index=None),
+                "reviewer_status": filter_cols[1].selectbox("Reviewer Status", catalog["reviewer_statuses"], index=None),
+                "date_from": filter_cols[2].date_input("From", value=None),
+                "date_to": filter_cols[3].date_input("To", value=None),
+            }
+            if st.session_state.role == "main_office":
+                report_filters["district"] = st.selectbox("District", catalog["districts"], index=None)
+            report_filters = {key: value for key, value in report_filters.items() if value}
+        if st.session_state.get("report_filters") != report_filters:
+            st.session_state.report_filters = report_filters
+            st.session_state.report_cursors = [None]
+        reports_df, next_cursor = fetch_reports(st.session_state.report_cursors[-1], report_filters)
+        page_cols = st.columns(2)
+        with page_cols[0]:
+            if len(st.session_state.report_cursors) > 1 and st.button("Previous page"):
+                st.session_state.report_cursors.pop()
+                st.rerun()
+        with page_cols[1]:
+            if next_cursor and st.button("Next page"):
+                st.session_state.report_cursors.append(next_cursor)
+                st.rerun()
         
         if not reports_df.empty:
             # Conditionally configure columns based on role
@@ -197,27 +256,25 @@ else:
                                     key=f"direct_download_{selected_reports[0]}"
                                 )
                         else:
-                            # Multiple files: Create a ZIP
-                            zip_buffer = BytesIO()
-                            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                                for report_code in selected_reports:
-                                    file_content, filename = download_report(report_code)
-                                    if file_content:
-                                        zip_file.writestr(filename, file_content)
-                            zip_buffer.seek(0)
-                            st.download_button(
-                                label="Download Selected Reports (ZIP)",
-                                data=zip_buffer,
-                                file_name="selected_reports.zip",
-                                mime="application/zip",
-                                key="download_zip"
-                            )
+                            # Multiple files: the server builds the ZIP in one request
+                            zip_content = download_reports_zip(selected_reports)
+                            if zip_content:
+                                st.download_button(
+                                    label="Download Selected Reports (ZIP)",
+                                    data=zip_content,
+                                    file_name="selected_reports.zip",
+                                    mime="application/zip",
+                                    key="download_zip"
+                                )
                 with col2:
                     if st.session_state.role == "district_user" and st.button("Delete Selected"):
-                        delete_selected_reports(selected_reports, reports_df)
+                        delete_selected_reports(selected_reports)
             else:
                 st.info("Select one or more reports to enable Download/Delete actions.")
 
+            if len(selected_reports) == 1:
+                show_report_rows(selected_reports[0])
+
             # Edit form (if applicable)
             if st.session_state.role == "district_user" and st.session_state.edit_report_code:
                 report_to_edit = reports_df[reports_df["report_code"] == st.session_state.edit_report_code].iloc[0]
@@ -237,25 +294,31 @@ else:
             # Status updates
             if st.session_state.role == "district_manager":
                 with st.expander("Update Checker Status"):
-                    report_to_check = st.selectbox("Select Report", reports_df["report_code"].tolist())
-                    checker_status = st.selectbox("Checker Status", ["Pending", "Checked", "Rejected"])
+                    reports_to_check = st.multiselect("Select Reports", reports_df["report_code"].tolist(),
+                                                      default=selected_reports, key="check_reports")
+                    checker_status = st.selectbox("Checker Status", catalog["checker_statuses"])
                     checker_comment = st.text_input("Comment (required for Rejected)")
                     if st.button("Update Checker Status"):
-                        if checker_status == "Rejected" and not checker_comment:
+                        if not reports_to_check:
+                            st.error("Select at least one report")
+                        elif checker_status == "Rejected" and not checker_comment:
                             st.error("Comment required for rejection")
                         else:
-                            update_status(report_to_check, checker_status=checker_status, comment=checker_comment)
+                            update_status(reports_to_check, checker_status=checker_status, comment=checker_comment)
 
             if st.session_state.role == "main_office":
                 with st.expander("Update Reviewer Status"):
-                    report_to_review = st.selectbox("Select Report", reports_df["report_code"].tolist())
-                    reviewer_status = st.selectbox("Reviewer Status", ["Pending", "Approved", "Rejected"])
+                    reports_to_review = st.multiselect("Select Reports", reports_df["report_code"].tolist(),
+                                                       default=selected_reports, key="review_reports")
+                    reviewer_status = st.selectbox("Reviewer Status", catalog["reviewer_statuses"])
                     reviewer_comment = st.text_input("Comment (required for Rejected)")
                     if st.button("Update Reviewer Status"):
-                        if reviewer_status == "Rejected" and not reviewer_comment:
+                        if not reports_to_review:
+                            st.error("Select at least one report")
+                        elif reviewer_status == "Rejected" and not reviewer_comment:
                             st.error("Comment required for rejection")
                         else:
-                            update_status(report_to_review, reviewer_status=reviewer_status, comment=reviewer_comment)
+                            update_status(reports_to_review, reviewer_status=reviewer_status, comment=reviewer_comment)
 
         else:
             st.info("No reports available yet.")
@@ -269,16 +332,18 @@ else:
             st.subheader("Upload Report")
             with st.form(key="upload_form"):
                 
-                report_type = st.selectbox("Report Type", ["balance_sheet", "income_statement", "cash_flow"])
+                report_type = st.selectbox("Report Type", catalog["upload_report_types"])
                 report_code = st.text_input("Report Code (e.g., FIN-001)")
                 title = st.text_input("Report Title")
                 description = st.text_input("Description")
-                category = st.selectbox("Category", ["Operation", "Finance", "Risk", "HR", "IT"])
+                category = st.selectbox("Category", catalog["categories"])
                 uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx", "xls"])
+                link_duplicate = st.checkbox("Store as a copy if this workbook was already uploaded")
                 submit_button = st.form_submit_button(label="Upload Report")
 
                 if submit_button and uploaded_file:
-                    success = upload_file(report_type, report_code, title, description, category, uploaded_file)
+                    success = upload_file(category, report_type, report_code, title, description, uploaded_file,
+                                          link_duplicate)
                     if success:
                         st.session_state.show_upload_form = False
                         st.rerun()
@@ -290,14 +355,18 @@ else:
                 for report_type, data in merged_data.items():
                     st.write(f"{report_type.capitalize()} Reports:")
                     st.dataframe(pd.DataFrame(data))
-                    buffer = BytesIO()
-                    pd.DataFrame(data).to_excel(buffer, index=False)
-                    st.download_button(
-                        label=f"Download {report_type} Merged Report",
-                        data=buffer.getvalue(),
-                        file_name=f"{report_type}_merged.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                    export_cols = st.columns(2)
+                    export_format = export_cols[0].selectbox("Format", ["xlsx", "csv", "parquet"], key=f"format_{report_type}")
+                    if export_cols[1].button("Prepare download", key=f"prepare_{report_type}"):
+                        content = export_merged_report(report_type, export_format)
+                        if content:
+                            st.download_button(
+                                label=f"Download {report_type} Merged Report",
+                                data=content,
+                                file_name=f"{report_type}_merged.{export_format}",
+                                mime=EXPORT_MEDIA_TYPES[export_format],
+                                key=f"download_{report_type}"
+                            )
 
     elif page == "Users":
         st.switch_page("pages/users.py")
\ No newline at end of file
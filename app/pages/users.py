@@ -1,23 +1,18 @@
 # pages/users.py
 import streamlit as st
-import requests
 import pandas as pd
-
-API_URL = "http://127.0.0.1:8000"
+from api_client import APIError, api_request, get_catalog, get_json, invalidate_cache
 
 st.set_page_config(page_title="Users", layout="wide")
 
 def fetch_users():
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.get(f"{API_URL}/users/", headers=headers)
-    if response.status_code == 200:
-        return pd.DataFrame(response.json())
-    else:
-        st.error(response.json()["detail"])
+    try:
+        return pd.DataFrame(get_json("/users/"))
+    except APIError as e:
+        st.error(e.detail)
         return None
 
 def add_user(username, password, full_name, position, phone_number, email_address, role, district=None):
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
     data = {
         "username": username,
         "password": password,
@@ -28,8 +23,9 @@ def add_user(username, password, full_name, position, phone_number, email_addres
         "role": role,
         "district": district
     }
-    response = requests.post(f"{API_URL}/users/", headers=headers, json=data)
+    response = api_request("POST", "/users/", json=data)
     if response.status_code == 200:
+        invalidate_cache()
         st.success(f"User '{username}' added successfully!")
         return True
     else:
@@ -44,6 +40,7 @@ if "token" not in st.session_state or st.session_state.token is None:
 elif st.session_state.role != "main_office":
     st.error("Only main office users can access this page.")
 else:
+    catalog = get_catalog()
     st.subheader("Current Users")
     users_df = fetch_users()
     if users_df is not None:
@@ -61,8 +58,8 @@ else:
             new_position = st.text_input("Position")
             new_phone_number = st.text_input("Phone Number")
             new_email = st.text_input("Email Address")
-            new_role = st.selectbox("Role", ["district_user", "district_manager", "main_office"])
-            new_district = st.selectbox("District", ["District1", "District2", "Arbaminch", "Sodo", "Hossana", "Karat", "Bonga", "Jemu", "Dilla", "Masha", "Bonga", "Tarcha", "Mizan", "Hawassa Sidama", "Worabe", "Sawla", "Welkite", "Jinka", "Hawassa Ketema", "Durame", "Halaba"], index=None, placeholder="Select a district (optional)") if new_role != "main_office" else None
+            new_role = st.selectbox("Role", catalog["roles"])
+            new_district = st.selectbox("District", catalog["districts"], index=None, placeholder="Select a district (optional)") if new_role != "main_office" else None
             new_username = st.text_input("Username")
             new_password = st.text_input("Password", type="password")
             submit_button = st.form_submit_button(label="Save User")
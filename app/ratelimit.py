@@ -0,0 +1,63 @@
+# ratelimit.py
+# In-process sliding-window rate limiting, used in front of the bcrypt check
+# on /token so repeated or scripted logins are turned away before hashing.
+import math
+import threading
+import time
+from collections import deque
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class SlidingWindowLimiter:
+    """Allow at most limit hits per key within any window of window seconds."""
+
+    def __init__(self, limit: int, window: float, timer=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.timer = timer
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Record a hit for key, or raise RateLimited without recording it when the window is full."""
+        with self._lock:
+            self._check(key, self.timer())
+            self._record(key, self.timer())
+
+    def check(self, key):
+        """Raise RateLimited when key's window is full, without recording anything."""
+        with self._lock:
+            self._check(key, self.timer())
+
+    def record(self, key):
+        """Record a hit for key even if its window is full; pair with check() to count only some outcomes."""
+        with self._lock:
+            self._record(key, self.timer())
+
+    def _check(self, key, now):
+        hits = self._hits.get(key)
+        if not hits:
+            return
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            raise RateLimited(math.ceil(hits[0] + self.window - now))
+
+    def _record(self, key, now):
+        self._hits.setdefault(key, deque()).append(now)
+        if len(self._hits) > 10_000:
+            self._prune(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _prune(self, now):
+        # Keys whose hits have all left the window carry no state worth keeping
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
@@ -0,0 +1,249 @@
+# responses.py
+import hashlib
+import os
+import re
+import zipfile
+from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from compression import choose_encoding
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int):
+    """Return (start, end) for a single byte range, None to serve the whole file, or "invalid"."""
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None  # multi-range or unknown units: fall back to a full response
+    first, last = match.groups()
+    if not first and not last:
+        return "invalid"
+    if not first:
+        length = int(last)
+        if length == 0:
+            return "invalid"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "invalid"
+    return start, end
+
+
+def _iter_file(f, start: int, length: int):
+    with f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _json_default(value):
+    # orjson handles str/int/float (NaN becomes null), dates and NumPy arrays natively
+    if value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps_json(content) -> bytes:
+    return orjson.dumps(content, default=_json_default, option=JSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson, including pandas and NumPy scalars."""
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+
+def frame_records(df: pd.DataFrame):
+    """DataFrame rows as dicts of plain Python values, built column-wise.
+
+    Much faster than to_dict(orient="records"): datetimes become ISO strings in
+    one NumPy cast, and NaN stays a float that orjson writes as null.
+    """
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            iso = values.to_numpy().astype("datetime64[s]").astype(str).astype(object)
+            iso[values.isna().to_numpy()] = None
+            columns[name] = iso.tolist()
+        else:
+            columns[name] = values.tolist()
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def etag_matches(request: Request, quoted_etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ tags (from compressed responses) match too
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or quoted_etag in tags
+
+
+def body_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+class EncodedJSON(NamedTuple):
+    etag: str
+    body: bytes
+
+
+def encode_json(content) -> EncodedJSON:
+    """Serialize and tag content; large payloads should call this from a worker thread."""
+    body = dumps_json(content)
+    return EncodedJSON(body_etag(body), body)
+
+
+def weak_etag(quoted_etag: str) -> str:
+    return quoted_etag if quoted_etag.startswith("W/") else "W/" + quoted_etag
+
+
+def etag_json_response(request: Request, body: bytes, quoted_etag: str, cache_control: str = "private, no-cache",
+                       content_encoding: str = None):
+    """Serve an encoded JSON body, or a bodiless 304 when the client already holds this ETag.
+
+    A body compressed with content_encoding goes out under the weak form of the tag.
+    """
+    headers = {"ETag": quoted_etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request, quoted_etag):
+        return Response(status_code=304, headers=headers)
+    if content_encoding:
+        headers.update({"ETag": weak_etag(quoted_etag), "Content-Encoding": content_encoding})
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def precompressed_json_response(request: Request, body: bytes, gzipped: bytes, quoted_etag: str, cache_control: str):
+    """Serve a JSON body encoded ahead of time, picking the gzip copy (under a weak ETag) when the client accepts it."""
+    headers = {"ETag": quoted_etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request, quoted_etag):
+        return Response(status_code=304, headers=headers)
+    if choose_encoding(request.headers.get("accept-encoding", ""), offered=("gzip",)):
+        headers.update({"ETag": weak_etag(quoted_etag), "Content-Encoding": "gzip"})
+        body = gzipped
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def safe_filename(name: str) -> str:
+    """A path- and header-safe file name: no separators, no leading dots, nothing a quoted header value can break on."""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_.") or "download"
+
+
+def file_download_response(request: Request, path: str, etag: str, filename: str, media_type: str = XLSX_MEDIA_TYPE):
+    """Stream a file from disk with ETag, conditional GET and single-range (resume) support.
+
+    The file is opened here, once, so it may be replaced or removed while it is sent;
+    a missing file raises FileNotFoundError before any response is built.
+    """
+    source = open(path, "rb")
+    size = os.fstat(source.fileno()).st_size
+    quoted_etag = f'"{etag}"'
+    headers = {
+        "ETag": quoted_etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+
+    if etag_matches(request, quoted_etag):
+        source.close()
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == quoted_etag):
+        byte_range = _parse_range(range_header, size)
+    if byte_range == "invalid":
+        source.close()
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        status_code = 206
+    else:
+        start, end = 0, size - 1
+        status_code = 200
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_file(source, start, end - start + 1), status_code=status_code,
+                             headers=headers, media_type=media_type)
+
+
+class ChunkBuffer:
+    """Write-only file object for zipfile and pyarrow writers that hands finished bytes back to a generator."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+            self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """Yield a ZIP archive piece by piece for (arcname, path) entries; only one chunk is buffered at a time."""
+    buffer = ChunkBuffer()
+    # Workbooks are already deflated internally, so storing them avoids burning CPU for no gain
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            with open(path, "rb") as source, archive.open(arcname, "w", force_zip64=True) as target:
+                while True:
+                    chunk = source.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    data = buffer.drain()
+    if data:
+        yield data
@@ -0,0 +1,94 @@
+# rollups.py
+# Precomputed per (template, district, month, category, measure) aggregates of
+# approved fact rows. Dashboards query these few thousand rows instead of
+# scanning the fact tables; approvals refresh only the groups a report touches.
+from sqlalchemy import Column, Float, Index, Integer, String, Table, and_, delete, func, literal, or_, select
+
+from facts import measure_columns, month_expression, quarter_expression
+
+DIMENSIONS = ["district", "month", "quarter", "category"]
+MEASURE_FUNCTIONS = ["sum", "avg", "min", "max", "count"]
+
+
+def build_rollup_table(metadata):
+    return Table(
+        "report_rollups", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("template", String, nullable=False),
+        Column("district", String, nullable=False),
+        Column("month", String(7), nullable=False),
+        Column("category", String, nullable=True),
+        Column("measure", String, nullable=False),
+        Column("row_count", Integer, nullable=False),
+        Column("total", Float, nullable=True),
+        Column("minimum", Float, nullable=True),
+        Column("maximum", Float, nullable=True),
+        Index("ix_report_rollups_lookup", "template", "measure", "district", "month"),
+    )
+
+
+def _approved_facts(fact_table, report_data, report_metadata, approved_status, dialect_name):
+    month = month_expression(fact_table.c.date, dialect_name)
+    joined = fact_table.join(report_data, report_data.c.id == fact_table.c.report_data_id).join(
+        report_metadata, report_metadata.c.report_data_id == fact_table.c.report_data_id)
+    return joined, month, report_metadata.c.reviewer_status == approved_status
+
+
+def refresh_statements(rollups, fact_table, template, spec, report_data, report_metadata, approved_status,
+                       dialect_name, keys=None):
+    """Statements that recompute the rollup rows for the given (district, month) keys, or all when keys is None."""
+    joined, month, approved = _approved_facts(fact_table, report_data, report_metadata, approved_status, dialect_name)
+    scope_rollups = rollups.c.template == template
+    scope_facts = approved
+    if keys is not None:
+        if not keys:
+            return []
+        scope_rollups = and_(scope_rollups, or_(*[and_(rollups.c.district == d, rollups.c.month == m) for d, m in keys]))
+        scope_facts = and_(scope_facts, or_(*[and_(fact_table.c.district == d, month == m) for d, m in keys]))
+    statements = [delete(rollups).where(scope_rollups)]
+    for measure, column in measure_columns(spec).items():
+        value = fact_table.c[column]
+        grouped = select(
+            literal(template), fact_table.c.district, month, report_data.c.category, literal(measure),
+            func.count(value), func.sum(value), func.min(value), func.max(value),
+        ).select_from(joined).where(scope_facts, value.isnot(None)).group_by(
+            fact_table.c.district, month, report_data.c.category)
+        statements.append(rollups.insert().from_select(
+            ["template", "district", "month", "category", "measure", "row_count", "total", "minimum", "maximum"], grouped))
+    return statements
+
+
+def report_keys_query(fact_table, report_data_ids, dialect_name):
+    """The (district, month) keys holding facts of the given reports."""
+    month = month_expression(fact_table.c.date, dialect_name)
+    return select(fact_table.c.district, month).where(
+        fact_table.c.report_data_id.in_(report_data_ids), fact_table.c.date.isnot(None)).distinct()
+
+
+def dimension_expression(rollups, dimension):
+    if dimension == "quarter":
+        return quarter_expression(rollups.c.month).label("quarter")
+    return rollups.c[dimension].label(dimension)
+
+
+def analytics_query(rollups, template, measure, dimensions, functions, district=None, month_from=None, month_to=None):
+    groups = [dimension_expression(rollups, d) for d in dimensions]
+    total_rows = func.sum(rollups.c.row_count)
+    values = {
+        "sum": func.sum(rollups.c.total),
+        "avg": func.sum(rollups.c.total) / func.nullif(total_rows, 0),
+        "min": func.min(rollups.c.minimum),
+        "max": func.max(rollups.c.maximum),
+        "count": total_rows,
+    }
+    query = select(*groups, *[values[f].label(f"{f}_{measure}") for f in functions]).where(
+        rollups.c.template == template, rollups.c.measure == measure)
+    if district:
+        query = query.where(rollups.c.district == district)
+    if month_from:
+        query = query.where(rollups.c.month >= month_from)
+    if month_to:
+        query = query.where(rollups.c.month <= month_to)
+    if groups:
+        query = query.group_by(*groups).order_by(*groups)
+    return query
@@ -0,0 +1,132 @@
+# storage.py
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+
+UPLOAD_DIR = "uploads"
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+SPOOL_DIR = os.path.join(UPLOAD_DIR, "spool")
+CHUNK_SIZE = 1024 * 1024
+
+
+@contextlib.contextmanager
+def atomic_write(path: str):
+    """Yield a temporary path next to path; on a clean exit it replaces path in one step, otherwise it is removed.
+
+    Readers see the old file or the new one, never a partial write.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class BlobStore:
+    """Content-addressed file store: each blob lives at <root>/<sha[:2]>/<sha>, so identical uploads are kept once."""
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def path(self, sha256: str, suffix: str = "") -> str:
+        return os.path.join(self.root, sha256[:2], sha256 + suffix)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def _commit(self, tmp_path: str, sha256: str) -> str:
+        target = self.path(sha256)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+        return sha256
+
+    def put_bytes(self, data: bytes) -> str:
+        sha256 = hashlib.sha256(data).hexdigest()
+        if self.exists(sha256):
+            return sha256
+        with atomic_write(self.path(sha256)) as tmp_path, open(tmp_path, "wb") as out:
+            out.write(data)
+        return sha256
+
+    def put_path(self, path: str, sha256: str) -> str:
+        """Move an already hashed file (e.g. a spooled upload) into the store."""
+        return self._commit(path, sha256)
+
+    def open(self, sha256: str):
+        return open(self.path(sha256), "rb")
+
+    def read_bytes(self, sha256: str) -> bytes:
+        with self.open(sha256) as f:
+            return f.read()
+
+    def delete(self, sha256: str):
+        """Remove a blob and any sidecar files stored next to it."""
+        directory = os.path.join(self.root, sha256[:2])
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.startswith(sha256):
+                path = os.path.join(directory, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+
+
+def spool_path(name: str) -> str:
+    return os.path.join(SPOOL_DIR, name)
+
+
+def spool_file(fileobj, path: str):
+    """Copy an upload stream to a spool file in chunks, hashing it on the way; returns (size, sha256)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    digest = hashlib.sha256()
+    written = 0
+    with open(path, "wb") as out:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            written += len(chunk)
+    return written, digest.hexdigest()
+
+
+def write_spool_chunk(path: str, offset: int, data: bytes):
+    """Write data at offset of a spool file, leaving the bytes after it alone (a later chunk may already be there)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as out:
+        out.seek(offset)
+        out.write(data)
+        out.flush()
+        os.fsync(out.fileno())
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def discard_spool(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+blob_store = BlobStore()
@@ -0,0 +1,140 @@
+# validation.py
+# Declarative upload templates and a vectorized validation engine.
+# Every check is a whole-column pandas/NumPy expression producing a boolean
+# mask of failing rows, so a sheet is validated in a handful of array passes.
+import numpy as np
+import pandas as pd
+
+MAX_REPORTED_ROWS = 100  # failing row numbers kept per rule; the count is always exact
+BALANCE_TOLERANCE = 0.01
+
+STRING = "string"
+DATETIME = "datetime"
+NUMBER = "number"
+
+
+class TemplateSpec:
+    def __init__(self, name, columns, required=None, ranges=None, rules=None):
+        self.name = name
+        self.columns = columns  # column name -> STRING | DATETIME | NUMBER
+        self.required = required or list(columns)
+        self.ranges = ranges or {}  # column name -> (min, max), either bound may be None
+        self.rules = rules or {}  # rule name -> fn(frame) returning a mask of failing rows
+
+    @property
+    def column_names(self):
+        return list(self.columns)
+
+
+def _balances(total, *parts, sign=None):
+    signs = sign or [1] * len(parts)
+
+    def rule(df):
+        expected = sum(s * df[p] for s, p in zip(signs, parts))
+        # Rows with a missing operand are reported by the required/dtype checks instead
+        checked = df[[total, *parts]].notna().all(axis=1)
+        return checked & ~np.isclose(df[total], expected, rtol=0, atol=BALANCE_TOLERANCE)
+    return rule
+
+
+TEMPLATE_SPECS = {
+    "balance_sheet": TemplateSpec(
+        "balance_sheet",
+        {"District": STRING, "Date": DATETIME, "Assets": NUMBER, "Liabilities": NUMBER, "Equity": NUMBER},
+        ranges={"Assets": (0, None), "Liabilities": (0, None)},
+        rules={"Assets = Liabilities + Equity": _balances("Assets", "Liabilities", "Equity")},
+    ),
+    "income_statement": TemplateSpec(
+        "income_statement",
+        {"District": STRING, "Date": DATETIME, "Revenue": NUMBER, "Expenses": NUMBER, "Net_Income": NUMBER},
+        ranges={"Revenue": (0, None), "Expenses": (0, None)},
+        rules={"Net_Income = Revenue - Expenses": _balances("Net_Income", "Revenue", "Expenses", sign=[1, -1])},
+    ),
+    "cash_flow": TemplateSpec(
+        "cash_flow",
+        {"District": STRING, "Date": DATETIME, "Cash_In": NUMBER, "Cash_Out": NUMBER, "Net_Cash": NUMBER},
+        ranges={"Cash_In": (0, None), "Cash_Out": (0, None)},
+        rules={"Net_Cash = Cash_In - Cash_Out": _balances("Net_Cash", "Cash_In", "Cash_Out", sign=[1, -1])},
+    ),
+}
+
+# Report types (see ReportType in catalog.py) that are uploaded with one of the templates above
+REPORT_TYPE_TEMPLATES = {
+    "Balance Sheet – Institutional\tNBE_FIN004": "balance_sheet",
+    "Balance Sheet – NBE NBE_FIN005": "balance_sheet",
+    "Income Statement NBE_FIN006": "income_statement",
+    "Profit and Loss Statement NBE_FIN010": "income_statement",
+}
+
+
+def template_for(report_type: str):
+    """Spec for a report type value or template name, or None when the type has no upload template."""
+    return TEMPLATE_SPECS.get(REPORT_TYPE_TEMPLATES.get(report_type, report_type))
+
+
+def coerce_frame(df: pd.DataFrame, spec: TemplateSpec) -> pd.DataFrame:
+    """Cast template columns to their declared types; values that do not fit become NaN/NaT."""
+    out = df.copy()
+    for name, kind in spec.columns.items():
+        if name not in out.columns:
+            continue
+        if kind == NUMBER:
+            out[name] = pd.to_numeric(out[name], errors="coerce").astype("float64")
+        elif kind == DATETIME:
+            out[name] = pd.to_datetime(out[name], errors="coerce")
+        else:
+            values = out[name]
+            out[name] = values.astype(str).astype(object).where(values.notna(), None)
+    return out
+
+
+class ValidationReport:
+    """Failing row numbers per rule, accumulated across chunks."""
+
+    def __init__(self):
+        self.counts = {}
+        self.rows = {}
+
+    def add(self, rule: str, mask, row_offset: int = 0):
+        mask = np.asarray(mask, dtype=bool)
+        count = int(mask.sum())
+        if not count:
+            return
+        self.counts[rule] = self.counts.get(rule, 0) + count
+        kept = self.rows.setdefault(rule, [])
+        room = MAX_REPORTED_ROWS - len(kept)
+        if room > 0:
+            kept.extend(int(i) + row_offset for i in np.flatnonzero(mask)[:room])
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def as_dict(self):
+        return {rule: {"count": self.counts[rule], "rows": self.rows[rule]} for rule in self.counts}
+
+
+def validate_frame(df: pd.DataFrame, spec: TemplateSpec, report: ValidationReport = None, row_offset: int = 0):
+    """Coerce and check one frame (or chunk). Returns (coerced frame, report).
+
+    Row numbers in the report are 0-based data rows plus row_offset, so chunked
+    callers pass the number of rows already seen.
+    """
+    report = report if report is not None else ValidationReport()
+    coerced = coerce_frame(df, spec)
+    for name, kind in spec.columns.items():
+        if name not in df.columns:
+            continue
+        raw_missing = df[name].isna().to_numpy()
+        if kind != STRING:
+            report.add(f"{name}: not a {kind}", coerced[name].isna().to_numpy() & ~raw_missing, row_offset)
+        if name in spec.required:
+            report.add(f"{name}: required", raw_missing, row_offset)
+    for name, (low, high) in spec.ranges.items():
+        values = coerced[name].to_numpy()
+        if low is not None:
+            report.add(f"{name}: below {low}", values < low, row_offset)
+        if high is not None:
+            report.add(f"{name}: above {high}", values > high, row_offset)
+    for rule, check in spec.rules.items():
+        report.add(rule, check(coerced).to_numpy(), row_offset)
+    return coerced, report
@@ -0,0 +1,53 @@
+# workers.py
+# Bounded worker pools for CPU-bound work (Excel parsing, bcrypt) so async
+# handlers await it instead of blocking the event loop.
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+PARSE_QUEUE_DEPTH = int(os.environ.get("PARSE_QUEUE_DEPTH", 16))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", 4))
+HASH_QUEUE_DEPTH = int(os.environ.get("HASH_QUEUE_DEPTH", 64))
+
+
+class PoolSaturated(Exception):
+    def __init__(self, pool_name: str):
+        super().__init__(f"{pool_name} pool is saturated")
+        self.pool_name = pool_name
+
+
+class WorkerPool:
+    """An executor plus a cap on in-flight jobs (running + queued); past the cap, run() fails fast with PoolSaturated."""
+
+    def __init__(self, name: str, executor_class, max_workers: int, max_queue: int):
+        self.name = name
+        self.executor_class = executor_class
+        self.max_workers = max_workers
+        self.max_in_flight = max_workers + max_queue
+        self.in_flight = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = self.executor_class(max_workers=self.max_workers)
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.max_in_flight:
+            raise PoolSaturated(self.name)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+parse_pool = WorkerPool("parse", ProcessPoolExecutor, PARSE_WORKERS, PARSE_QUEUE_DEPTH)
+hash_pool = WorkerPool("hash", ThreadPoolExecutor, HASH_WORKERS, HASH_QUEUE_DEPTH)
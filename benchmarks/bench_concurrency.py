@@ -0,0 +1,93 @@
+# bench_concurrency.py
+# p50/p99 latency of the API under mixed load: many cheap listing requests
+# interleaved with expensive merged-report reads, all on one event loop.
+# Runs against a fresh database in a temporary directory.
+#
+#   python benchmarks/bench_concurrency.py [reports] [requests] [concurrency] [merged_every]
+#
+# merged_every=0 runs the listing requests alone as a baseline.
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def seed(main, reports):
+    import pandas as pd
+
+    with main.SessionLocal() as db:
+        for i in range(reports):
+            df = pd.DataFrame({"District": ["District1"] * 500,
+                               "Date": pd.date_range("2024-01-01", periods=500, freq="D"),
+                               "Assets": range(500), "Liabilities": range(500), "Equity": [0] * 500})
+            sha256 = main.blob_store.put_bytes(f"bench-{i}".encode())
+            main.columnar.write_frame(sha256, df)
+            data = main.ReportData(report_type="balance_sheet", report_code=f"B{i:05d}", category="Finance",
+                                   district="District1", file_sha256=sha256)
+            db.add(data)
+            db.flush()
+            db.add(main.ReportMetadata(report_data_id=data.id, report_type="balance_sheet", report_code=data.report_code,
+                                       district="District1", title="bench", description="bench", prepared_by="district1_user",
+                                       created_date=datetime.now() - timedelta(days=i), checker_status="Checked",
+                                       reviewer_status="Approved" if i % 2 else "Pending"))
+        db.commit()
+        db.query(main.MergedReport).delete()
+        db.commit()
+        main.bootstrap_merged(db)
+
+
+async def run_load(main, total, concurrency, merged_every):
+    import httpx
+
+    token = main.create_access_token({"sub": "mainoffice_user"}, timedelta(minutes=30))
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = {"list": [], "merged": []}
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            kind, url = ("merged", "/reports/merged/") if merged_every and i % merged_every == 0 else ("list", "/reports/?limit=50")
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                latencies[kind].append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+def main():
+    reports = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    merged_every = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import main as app_main
+
+        seed(app_main, reports)
+        latencies, elapsed = asyncio.run(run_load(app_main, total, concurrency, merged_every))
+        print(f"{total} requests, concurrency {concurrency}, {reports} reports: {total / elapsed:.1f} req/s")
+        for kind, samples in latencies.items():
+            if not samples:
+                continue
+            print(f"  {kind:<7} n={len(samples):<5} p50={statistics.median(samples):8.2f} ms"
+                  f"  p99={percentile(samples, 99):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
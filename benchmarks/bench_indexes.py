@@ -0,0 +1,101 @@
+# bench_indexes.py
+# Query plans and timings for the report queries before and after the
+# indexes added by migrations.py. Builds a throwaway SQLite database with the
+# pre-migration schema, so it never touches reports.db.
+#
+#   python benchmarks/bench_indexes.py [reports_per_district]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from migrations import run_migrations  # noqa: E402
+
+DISTRICTS = ["District1", "District2", "Arbaminch", "Sodo", "Hossana", "Karate", "Bonga", "Jemu", "Dilla", "Masha",
+             "Tarcha", "Mizan", "Hawassa Sidama", "Worabe", "Sawla", "Welkite", "Jinka", "Hawassa Ketema", "Durame",
+             "Halaba", "Konso"]
+
+BASELINE_SCHEMA = [
+    """CREATE TABLE report_data (id INTEGER NOT NULL PRIMARY KEY, report_type VARCHAR, report_code VARCHAR UNIQUE,
+       category VARCHAR, district VARCHAR, data_json TEXT, file_content TEXT)""",
+    """CREATE TABLE report_metadata (id INTEGER NOT NULL PRIMARY KEY,
+       report_data_id INTEGER NOT NULL REFERENCES report_data (id), report_type VARCHAR, report_code VARCHAR,
+       title VARCHAR, description VARCHAR, prepared_by VARCHAR, created_date DATE, checker_status VARCHAR,
+       reviewer_status VARCHAR, checker_comment VARCHAR, reviewer_comment VARCHAR)""",
+]
+
+QUERIES_BEFORE = {
+    "status by report_code": "SELECT * FROM report_metadata WHERE report_code = :code",
+    "district listing page": """SELECT m.* FROM report_metadata m JOIN report_data d ON m.report_data_id = d.id
+        WHERE d.district = :district ORDER BY m.created_date DESC, m.id DESC LIMIT 100""",
+    "approved join": """SELECT d.id FROM report_data d JOIN report_metadata m ON m.report_data_id = d.id
+        WHERE m.reviewer_status = 'Approved'""",
+}
+
+QUERIES_AFTER = dict(QUERIES_BEFORE, **{
+    "district listing page": """SELECT m.* FROM report_metadata m JOIN report_data d ON m.report_data_id = d.id
+        WHERE m.district = :district ORDER BY m.created_date DESC, m.id DESC LIMIT 100""",
+})
+
+PARAMS = {"code": "R-District2-00042", "district": "Sodo"}
+
+
+def populate(engine, per_district):
+    rng = random.Random(7)
+    start = date(2020, 1, 1)
+    data_rows, meta_rows = [], []
+    for district in DISTRICTS:
+        for i in range(per_district):
+            row_id = len(data_rows) + 1
+            code = f"R-{district}-{i:05d}"
+            data_rows.append({"id": row_id, "code": code, "district": district})
+            meta_rows.append({"id": row_id, "data_id": row_id, "code": code,
+                              "created": start + timedelta(days=rng.randrange(5 * 365)),
+                              "reviewer": rng.choice(["Pending", "Approved", "Rejected"])})
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO report_data (id, report_type, report_code, category, district) "
+                          "VALUES (:id, 'balance_sheet', :code, 'Finance', :district)"), data_rows)
+        conn.execute(text("INSERT INTO report_metadata (id, report_data_id, report_type, report_code, created_date, "
+                          "checker_status, reviewer_status) VALUES (:id, :data_id, 'balance_sheet', :code, :created, "
+                          "'Checked', :reviewer)"), meta_rows)
+    return len(data_rows)
+
+
+def measure(engine, queries, repeat=20):
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        for name, sql in queries.items():
+            plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), PARAMS)]
+            started = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), PARAMS).fetchall()
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            print(f"  {name:<24} {elapsed:8.3f} ms")
+            for step in plan:
+                print(f"      {step}")
+
+
+def main():
+    per_district = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with engine.begin() as conn:
+            for ddl in BASELINE_SCHEMA:
+                conn.execute(text(ddl))
+        total = populate(engine, per_district)
+        print(f"{total} reports across {len(DISTRICTS)} districts\n")
+        print("before migrations:")
+        measure(engine, QUERIES_BEFORE)
+        run_migrations(engine)
+        print("\nafter migrations:")
+        measure(engine, QUERIES_AFTER)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench_json.py
+# Encode time and bytes on the wire for a merged-report payload: the previous
+# path (to_dict + jsonable_encoder + json.dumps) against frame_records +
+# orjson, and identity against gzip/brotli as negotiated by the middleware.
+#
+#   python benchmarks/bench_json.py [rows] [repeat]
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from compression import brotli, compress  # noqa: E402
+from responses import dumps_json, frame_records  # noqa: E402
+
+
+def merged_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    assets = rng.uniform(0, 1e6, rows).round(2)
+    liabilities = (assets * rng.uniform(0.3, 0.9, rows)).round(2)
+    equity = (assets - liabilities).round(2)
+    equity[::97] = np.nan  # a sprinkling of missing values, as in real uploads
+    return pd.DataFrame({
+        "District": rng.choice(["District1", "District2", "Arbaminch", "Sodo", "Hossana"], rows),
+        "Date": pd.date_range("2020-01-01", periods=rows, freq="h"),
+        "Assets": assets, "Liabilities": liabilities, "Equity": equity,
+        "Branch": rng.integers(1, 400, rows),
+    })
+
+
+def timed(fn, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def old_path(df):
+    # The previous serializer rejects NaN (allow_nan=False), so fill it the way a client would see null
+    content = jsonable_encoder(df.astype(object).where(df.notna(), None).to_dict(orient="records"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    df = merged_frame(rows)
+    payload = {"balance_sheet": df}
+    print(f"{rows} rows, best of {repeat}")
+
+    old_seconds, old_body = timed(lambda: old_path(df), repeat)
+    new_seconds, new_body = timed(lambda: dumps_json({k: frame_records(v) for k, v in payload.items()}), repeat)
+    print(f"{'encoder':<32}{'seconds':>10}{'bytes':>14}")
+    print(f"{'to_dict+jsonable_encoder+json':<32}{old_seconds:>10.3f}{len(old_body):>14,}")
+    print(f"{'frame_records+orjson':<32}{new_seconds:>10.3f}{len(new_body):>14,}")
+
+    print(f"\n{'encoding':<32}{'seconds':>10}{'bytes':>14}{'ratio':>8}")
+    print(f"{'identity':<32}{0:>10.3f}{len(new_body):>14,}{1:>8.2f}")
+    for encoding in ["gzip", "br"]:
+        if encoding == "br" and brotli is None:
+            print(f"{'br':<32}{'(brotli not installed)':>32}")
+            continue
+        seconds, body = timed(lambda: compress(new_body, encoding), repeat)
+        print(f"{encoding:<32}{seconds:>10.3f}{len(body):>14,}{len(new_body) / len(body):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()